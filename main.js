@@ -13,6 +13,67 @@ const isDev = !app.isPackaged; // Simple check, might need refinement
 
 let mainWindow; // Make mainWindow accessible for sending messages
 
+// POSTs to a Python streaming endpoint (?format=ndjson) and calls onEvent for every JSON line received.
+// Resolves with the terminal 'done' event (or the last 'error' event) once the response ends. Errors reported
+// before the stream opens (unknown model, missing or rejected key) come back as a plain JSON body, with any
+// status; that body is resolved as-is so the renderer sees the server's message.
+async function postNdjsonStream(url, body, signal, onEvent) {
+  const response = await axios.post(url, body, { responseType: 'stream', signal, validateStatus: () => true });
+  const isNdjson = String(response.headers['content-type'] || '').includes('application/x-ndjson');
+  return new Promise((resolve, reject) => {
+    let buffered = '';
+    let terminalEvent = null;
+    const handleLine = (rawLine) => {
+      const line = rawLine.trim();
+      if (!line) return;
+      try {
+        const streamEvent = JSON.parse(line);
+        if (streamEvent.type === 'done' || streamEvent.type === 'error') {
+          terminalEvent = streamEvent;
+        } else {
+          onEvent(streamEvent);
+        }
+      } catch (error) {
+        // A malformed line (or a failing onEvent) must not throw out of the stream handler in the main process.
+        console.error('Error handling line from Python stream:', error.message, line.slice(0, 200));
+      }
+    };
+    response.data.on('data', (chunk) => {
+      buffered += chunk.toString('utf8');
+      if (!isNdjson) return; // Plain JSON error body; parsed whole on 'end'
+      let newlineIndex;
+      while ((newlineIndex = buffered.indexOf('\n')) >= 0) {
+        const line = buffered.slice(0, newlineIndex);
+        buffered = buffered.slice(newlineIndex + 1);
+        handleLine(line);
+      }
+    });
+    response.data.on('end', () => {
+      if (isNdjson) {
+        handleLine(buffered); // Last line may have no trailing newline
+        resolve(terminalEvent || { success: false, error: 'Stream ended without a result.' });
+        return;
+      }
+      let payload = null;
+      try {
+        payload = JSON.parse(buffered);
+      } catch (error) {
+        // Not JSON either; fall through to a status-only error.
+      }
+      if (payload && typeof payload === 'object' && payload.success !== undefined) {
+        resolve(payload);
+      } else {
+        resolve({ success: false, error: `LLM Server error: ${response.status}`, data: payload });
+      }
+    });
+    response.data.on('error', reject);
+  });
+}
+
+function isAbortError(error) {
+  return axios.isCancel(error) || error.name === 'CanceledError' || error.name === 'AbortError';
+}
+
 // Basic function to create the main application window
 function createWindow () {
   mainWindow = new BrowserWindow({
@@ -151,14 +212,16 @@ app.whenReady().then(() => {
   });
 
   // IPC handler for script generation
-  ipcMain.handle('llm-generate-script', async (event, { prompt, modelIdentifier, apiKey, systemPrompt }) => {
+  ipcMain.handle('llm-generate-script', async (event, { prompt, modelIdentifier, apiKey, systemPrompt, routing, cache }) => {
     console.log(`Main process: Received llm-generate-script request for model: ${modelIdentifier}, systemPrompt provided: ${!!systemPrompt}`);
     try {
       const body = {
         prompt: prompt,
         model_identifier: modelIdentifier,
         api_key: apiKey || null, // Ensure apiKey is null if not provided, not undefined
-        system_prompt: systemPrompt || null // Pass system_prompt, ensure null if not provided
+        system_prompt: systemPrompt || null, // Pass system_prompt, ensure null if not provided
+        routing: routing || null, // Optional { models, api_keys, strategy, hedge, hedge_after_ms } for failover/hedging
+        cache: cache || 'bypass' // 'use' returns a stored script for an identical request, 'refresh' regenerates and stores it
       };
       // console.log("Sending to Python backend:", body);
       const response = await axios.post('http://127.0.0.1:8000/generate-script', body);
@@ -175,6 +238,157 @@ app.whenReady().then(() => {
     }
   });
 
+  // IPC handlers for scene-level editing: parse a script into scenes, and rewrite/extend one scene
+  // without regenerating the rest of the script.
+  ipcMain.handle('llm-parse-script', async (event, { script }) => {
+    try {
+      const response = await axios.post('http://127.0.0.1:8000/script/parse', { script });
+      return response.data;
+    } catch (error) {
+      console.error('Error calling Python /script/parse endpoint:', error.message);
+      return { success: false, error: error.response ? `LLM Server error: ${error.response.status}` : `Error parsing script: ${error.message}` };
+    }
+  });
+
+  ipcMain.handle('llm-edit-scene', async (event, { script, sceneIndex, mode, instruction, modelIdentifier, apiKey, systemPrompt, cache }) => {
+    console.log(`Main process: Received llm-edit-scene request (${mode || 'rewrite'} scene ${sceneIndex}) for model: ${modelIdentifier}`);
+    try {
+      const body = {
+        script: script,
+        scene_index: sceneIndex,
+        mode: mode || 'rewrite',
+        instruction: instruction || '',
+        model_identifier: modelIdentifier,
+        api_key: apiKey || null,
+        system_prompt: systemPrompt || null,
+        cache: cache || 'bypass'
+      };
+      const response = await axios.post('http://127.0.0.1:8000/script/scene', body);
+      return response.data;
+    } catch (error) {
+      console.error('Error calling Python /script/scene endpoint:', error.message);
+      if (error.response) {
+        return { success: false, error: (error.response.data && error.response.data.error) || `LLM Server error: ${error.response.status}`, data: error.response.data };
+      } else if (error.request) {
+        return { success: false, error: 'No response from Python LLM endpoint. Is the Python server running correctly?' };
+      } else {
+        return { success: false, error: `Error setting up LLM request: ${error.message}` };
+      }
+    }
+  });
+
+  // IPC handlers for background script jobs. The job keeps running in the Python backend if this request
+  // times out or the window reloads; the renderer can look it up again by id.
+  const postJobRequest = async (method, url, body) => {
+    try {
+      const response = await axios({ method, url: `http://127.0.0.1:8000${url}`, data: body });
+      return response.data;
+    } catch (error) {
+      console.error(`Error calling Python ${url} endpoint:`, error.message);
+      if (error.response) {
+        return { success: false, error: (error.response.data && error.response.data.error) || `LLM Server error: ${error.response.status}`, data: error.response.data };
+      }
+      return { success: false, error: 'No response from Python LLM endpoint. Is the Python server running correctly?' };
+    }
+  };
+  ipcMain.handle('llm-submit-script-job', async (event, { prompt, modelIdentifier, apiKey, systemPrompt, cache }) => {
+    console.log(`Main process: Received llm-submit-script-job request for model: ${modelIdentifier}`);
+    return postJobRequest('post', '/jobs', {
+      prompt: prompt,
+      model_identifier: modelIdentifier,
+      api_key: apiKey || null,
+      system_prompt: systemPrompt || null,
+      cache: cache || 'bypass'
+    });
+  });
+  ipcMain.handle('llm-get-script-job', async (event, { jobId, offset }) => postJobRequest('get', `/jobs/${encodeURIComponent(jobId)}?offset=${offset || 0}`));
+  ipcMain.handle('llm-cancel-script-job', async (event, { jobId }) => postJobRequest('post', `/jobs/${encodeURIComponent(jobId)}/cancel`));
+
+  // IPC handler for streamed script generation.
+  // Deltas are forwarded to the renderer on the 'llm-script-stream' channel as they arrive;
+  // the returned promise resolves with the terminal 'done' (or 'error') event.
+  const activeScriptStreams = new Map(); // requestId -> AbortController
+  ipcMain.handle('llm-generate-script-stream', async (event, { requestId, prompt, modelIdentifier, apiKey, systemPrompt, cache }) => {
+    console.log(`Main process: Received llm-generate-script-stream request ${requestId} for model: ${modelIdentifier}`);
+    const controller = new AbortController();
+    activeScriptStreams.set(requestId, controller);
+    try {
+      const body = {
+        prompt: prompt,
+        model_identifier: modelIdentifier,
+        api_key: apiKey || null,
+        system_prompt: systemPrompt || null,
+        cache: cache || 'bypass'
+      };
+      return await postNdjsonStream('http://127.0.0.1:8000/generate-script/stream?format=ndjson', body, controller.signal, (streamEvent) => {
+        if (streamEvent.type === 'delta') {
+          event.sender.send('llm-script-stream', { requestId, text: streamEvent.text });
+        }
+      });
+    } catch (error) {
+      if (isAbortError(error)) {
+        return { success: false, cancelled: true, error: 'Script generation cancelled.' };
+      }
+      console.error('Error calling Python /generate-script/stream endpoint:', error.message);
+      if (error.request) {
+        return { success: false, error: 'No response from Python LLM endpoint. Is the Python server running correctly?' };
+      } else {
+        return { success: false, error: `Error setting up LLM request: ${error.message}` };
+      }
+    } finally {
+      activeScriptStreams.delete(requestId);
+    }
+  });
+  ipcMain.on('llm-generate-script-stream-cancel', (event, { requestId }) => {
+    const controller = activeScriptStreams.get(requestId);
+    if (controller) {
+      // Aborting closes the HTTP connection; the Python server then cancels the upstream provider stream.
+      controller.abort();
+    }
+  });
+
+  // IPC handler for batch generation (scene variants, alternate takes).
+  // Each job's result is forwarded on 'llm-script-batch-result' as soon as it finishes, with its job index;
+  // the returned promise resolves with the batch summary. Cancel with 'llm-generate-script-stream-cancel'.
+  ipcMain.handle('llm-generate-script-batch', async (event, { requestId, jobs, prompt, modelIdentifier, apiKey, systemPrompt, maxConcurrency, cache }) => {
+    console.log(`Main process: Received llm-generate-script-batch request ${requestId} with ${jobs.length} jobs`);
+    const controller = new AbortController();
+    activeScriptStreams.set(requestId, controller);
+    try {
+      const body = {
+        jobs: jobs.map((job) => ({
+          prompt: job.prompt ?? null,
+          model_identifier: job.modelIdentifier || null,
+          api_key: job.apiKey || null,
+          system_prompt: job.systemPrompt || null
+        })),
+        prompt: prompt ?? null,
+        model_identifier: modelIdentifier || null,
+        api_key: apiKey || null,
+        system_prompt: systemPrompt || null,
+        max_concurrency: maxConcurrency || null,
+        cache: cache || 'bypass'
+      };
+      return await postNdjsonStream('http://127.0.0.1:8000/generate-script/batch?format=ndjson', body, controller.signal, (streamEvent) => {
+        if (streamEvent.type === 'result') {
+          event.sender.send('llm-script-batch-result', { requestId, ...streamEvent });
+        }
+      });
+    } catch (error) {
+      if (isAbortError(error)) {
+        return { success: false, cancelled: true, error: 'Batch generation cancelled.' };
+      }
+      console.error('Error calling Python /generate-script/batch endpoint:', error.message);
+      if (error.request) {
+        return { success: false, error: 'No response from Python LLM endpoint. Is the Python server running correctly?' };
+      } else {
+        return { success: false, error: `Error setting up batch request: ${error.message}` };
+      }
+    } finally {
+      activeScriptStreams.delete(requestId);
+    }
+  });
+
   // IPC handlers for API keys
   ipcMain.handle('get-api-key', (event, serviceName) => {
     return store.get(serviceName); // e.g., serviceName = 'ANTHROPIC_API_KEY'
@@ -13,7 +13,7 @@ contextBridge.exposeInMainWorld('electronAPI', {
 
   // Example for receiving events from Main (Main to Renderer), if needed later
   on: (channel, func) => {
-    const validChannels = ['open-api-key-settings']; // Whitelist channels
+    const validChannels = ['open-api-key-settings', 'llm-script-stream', 'llm-script-batch-result']; // Whitelist channels
     if (validChannels.includes(channel)) {
       ipcRenderer.on(channel, (event, ...args) => func(...args));
     }
@@ -22,7 +22,15 @@ contextBridge.exposeInMainWorld('electronAPI', {
   // Specifically expose channels we intend to use for clarity and potential future validation
   getAppVersion: () => ipcRenderer.invoke('get-app-version'),
   pingPythonBackend: () => ipcRenderer.invoke('ping-python-backend'),
-  generateLlmScript: (data) => ipcRenderer.invoke('llm-generate-script', data),
+  generateLlmScript: (data) => ipcRenderer.invoke('llm-generate-script', data), // Generation calls take an optional cache: 'bypass' (default) | 'use' | 'refresh'
+  generateLlmScriptStream: (data) => ipcRenderer.invoke('llm-generate-script-stream', data), // deltas arrive on 'llm-script-stream'
+  cancelLlmScriptStream: (requestId) => ipcRenderer.send('llm-generate-script-stream-cancel', { requestId }),
+  generateLlmScriptBatch: (data) => ipcRenderer.invoke('llm-generate-script-batch', data), // results arrive on 'llm-script-batch-result'
+  parseLlmScript: (data) => ipcRenderer.invoke('llm-parse-script', data),
+  editLlmScene: (data) => ipcRenderer.invoke('llm-edit-scene', data), // { script, sceneIndex, mode: 'rewrite' | 'extend', instruction, ... }
+  submitLlmScriptJob: (data) => ipcRenderer.invoke('llm-submit-script-job', data), // resolves with { id, status, ... }
+  getLlmScriptJob: (data) => ipcRenderer.invoke('llm-get-script-job', data), // { jobId, offset } -> status + output from offset
+  cancelLlmScriptJob: (jobId) => ipcRenderer.invoke('llm-cancel-script-job', { jobId }),
   saveApiKey: (data) => ipcRenderer.send('save-api-key', data), // send for save, no response needed by UI beyond confirmation
   getApiKey: (serviceName) => ipcRenderer.invoke('get-api-key', serviceName),
   validateApiKey: (data) => ipcRenderer.invoke('validate-api-key', data),
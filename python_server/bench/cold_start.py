@@ -0,0 +1,90 @@
+# Measures backend cold start the way the Electron app sees it: time from spawning uvicorn to the first
+# successful GET /ping, over several fresh processes. Also reports how long `import main` takes on its own.
+#
+#   cd python_server
+#   python bench/cold_start.py --runs 10
+#
+# --server-dir measures another checkout (e.g. a `git worktree` of an older commit) for before/after numbers.
+
+from typing import List
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_ping(server_dir: str, timeout: float) -> float:
+    port = free_port()
+    env = {**os.environ, "AI_VIDEO_EDITOR_DATA_DIR": tempfile.mkdtemp(prefix="ave-coldstart-")}
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                               cwd=server_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"backend exited with code {process.returncode}")
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/ping").status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.005)
+        raise RuntimeError(f"/ping did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def import_time(server_dir: str) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    env = {**os.environ, "AI_VIDEO_EDITOR_DATA_DIR": tempfile.mkdtemp(prefix="ave-coldstart-")}
+    output = subprocess.run([sys.executable, "-c", code], cwd=server_dir, env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def summarize(values: List[float]) -> dict:
+    return {
+        "min_ms": round(min(values) * 1000, 1),
+        "median_ms": round(statistics.median(values) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure Python backend cold start (spawn -> first /ping).")
+    parser.add_argument("--server-dir", default=SERVER_DIR, help="Directory containing main.py")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    ping_times = [time_to_first_ping(args.server_dir, args.timeout) for _ in range(args.runs)]
+    import_times = [import_time(args.server_dir) for _ in range(args.runs)]
+    results = {"server_dir": args.server_dir, "runs": args.runs, "first_ping": summarize(ping_times), "import_main": summarize(import_times)}
+    print(f"{'':<14}{'min ms':>10}{'median ms':>12}{'max ms':>10}")
+    for name in ("first_ping", "import_main"):
+        r = results[name]
+        print(f"{name:<14}{r['min_ms']:>10}{r['median_ms']:>12}{r['max_ms']:>10}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
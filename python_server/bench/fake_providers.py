@@ -0,0 +1,242 @@
+# Local stand-ins for the Anthropic Messages API and the Gemini generateContent API, for benchmarking the
+# backend without network access or API credits. Both live in one FastAPI app:
+#
+#   Anthropic: POST /v1/messages                                  (set ANTHROPIC_BASE_URL=http://127.0.0.1:8100)
+#   Gemini:    POST /v1beta/models/{model}:generateContent        (set GEMINI_BASE_URL=http://127.0.0.1:8100/v1beta)
+#              POST /v1beta/models/{model}:streamGenerateContent?alt=sse
+#              GET  /v1beta/models
+#
+# Latency, token rate and error rates are set on the command line and can be changed at runtime with
+# POST /_config (JSON body with any FakeConfig field). Keys starting with "bad" are rejected as invalid.
+#
+#   cd python_server
+#   python bench/fake_providers.py --port 8100 --first-token-ms 400 --tokens-per-second 80 --rate-limit-rate 0.05
+
+from dataclasses import asdict, dataclass
+import argparse
+import asyncio
+import json
+import random
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeConfig:
+    first_token_ms: float = 300.0 # Time before the first token (or the whole response, non-streamed)
+    jitter_ms: float = 50.0 # Uniform +/- jitter on first_token_ms
+    tokens_per_second: float = 100.0 # Output rate once generation has started; 0 = instant
+    output_tokens: int = 400 # Tokens per response (each "token" is one word of the canned script)
+    tokens_per_chunk: int = 5 # Tokens per streamed delta
+    rate_limit_rate: float = 0.0 # Fraction of requests answered with 429
+    server_error_rate: float = 0.0 # Fraction answered with 500/503 (Anthropic: 529 overloaded)
+    blocked_rate: float = 0.0 # Fraction of Gemini requests blocked by the prompt safety filter
+    retry_after_seconds: float = 1.0 # retry-after header sent with 429s
+    seed: int = 0 # 0 = unseeded
+
+
+config = FakeConfig()
+rng = random.Random()
+app = FastAPI()
+
+SCRIPT_WORDS = (
+    "## INT. EDITING SUITE - NIGHT\n\nRows of monitors glow over a cluttered desk. MAYA (30s) scrubs through a "
+    "timeline, coffee gone cold beside her.\n\nMAYA\n(muttering)\nOne more pass and it's done.\n\nThe render bar "
+    "crawls forward. A notification chimes.\n\nJONAS (O.S.)\nTell me you saved it this time.\n\n"
+).split(" ")
+
+stats = {"anthropic_requests": 0, "gemini_requests": 0, "rate_limited": 0, "server_errors": 0, "blocked": 0}
+
+
+def fake_tokens(count: int):
+    return [SCRIPT_WORDS[i % len(SCRIPT_WORDS)] + " " for i in range(count)]
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+async def wait_first_token():
+    delay = config.first_token_ms + rng.uniform(-config.jitter_ms, config.jitter_ms)
+    await asyncio.sleep(max(0.0, delay) / 1000)
+
+
+async def wait_tokens(count: int):
+    if config.tokens_per_second > 0:
+        await asyncio.sleep(count / config.tokens_per_second)
+
+
+def roll(rate: float) -> bool:
+    return rate > 0 and rng.random() < rate
+
+
+@app.post("/_config")
+async def update_config(request: Request):
+    global rng
+    for name, value in (await request.json()).items():
+        if hasattr(config, name):
+            setattr(config, name, type(getattr(config, name))(value))
+    rng = random.Random(config.seed or None)
+    return asdict(config)
+
+
+@app.get("/_stats")
+async def get_stats():
+    return {"config": asdict(config), **stats}
+
+
+# --- Anthropic Messages API ---
+
+def anthropic_error(status_code: int, error_type: str, message: str, headers=None):
+    return JSONResponse(status_code=status_code, content={"type": "error", "error": {"type": error_type, "message": message}}, headers=headers)
+
+
+def anthropic_sse(event_type: str, payload: dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps({'type': event_type, **payload})}\n\n"
+
+
+@app.post("/v1/messages")
+async def anthropic_messages(request: Request):
+    stats["anthropic_requests"] += 1
+    body = await request.json()
+    if request.headers.get("x-api-key", "").startswith("bad"):
+        return anthropic_error(401, "authentication_error", "invalid x-api-key")
+    if roll(config.rate_limit_rate):
+        stats["rate_limited"] += 1
+        return anthropic_error(429, "rate_limit_error", "Number of requests has exceeded your rate limit.",
+                               headers={"retry-after": str(config.retry_after_seconds)})
+    if roll(config.server_error_rate):
+        stats["server_errors"] += 1
+        return anthropic_error(529, "overloaded_error", "Overloaded")
+
+    model = body.get("model", "claude-fake")
+    max_tokens = int(body.get("max_tokens", 1024))
+    output_count = min(config.output_tokens, max_tokens)
+    stop_reason = "end_turn" if config.output_tokens <= max_tokens else "max_tokens"
+    prompt_text = (body.get("system") or "") + json.dumps(body.get("messages", []))
+    input_tokens = count_tokens(prompt_text)
+    message_id = f"msg_{uuid.uuid4().hex[:24]}"
+    tokens = fake_tokens(output_count)
+
+    if not body.get("stream"):
+        await wait_first_token()
+        await wait_tokens(output_count)
+        return {
+            "id": message_id, "type": "message", "role": "assistant", "model": model,
+            "content": [{"type": "text", "text": "".join(tokens)}],
+            "stop_reason": stop_reason, "stop_sequence": None,
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_count},
+        }
+
+    async def events():
+        yield anthropic_sse("message_start", {"message": {
+            "id": message_id, "type": "message", "role": "assistant", "model": model, "content": [],
+            "stop_reason": None, "stop_sequence": None, "usage": {"input_tokens": input_tokens, "output_tokens": 1},
+        }})
+        yield anthropic_sse("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+        await wait_first_token()
+        for start in range(0, output_count, config.tokens_per_chunk):
+            chunk = tokens[start:start + config.tokens_per_chunk]
+            yield anthropic_sse("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": "".join(chunk)}})
+            await wait_tokens(len(chunk))
+        yield anthropic_sse("content_block_stop", {"index": 0})
+        yield anthropic_sse("message_delta", {"delta": {"stop_reason": stop_reason, "stop_sequence": None}, "usage": {"output_tokens": output_count}})
+        yield anthropic_sse("message_stop", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+# --- Gemini generateContent API ---
+
+def gemini_error(status_code: int, status: str, message: str, reason: str = None, headers=None):
+    error = {"code": status_code, "message": message, "status": status}
+    if reason:
+        error["details"] = [{"@type": "type.googleapis.com/google.rpc.ErrorInfo", "reason": reason}]
+    return JSONResponse(status_code=status_code, content={"error": error}, headers=headers)
+
+
+def gemini_chunk(text: str, finish_reason: str = None, usage: dict = None) -> dict:
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finish_reason:
+        candidate["finishReason"] = finish_reason
+    chunk = {"candidates": [candidate]}
+    if usage:
+        chunk["usageMetadata"] = usage
+    return chunk
+
+
+@app.get("/v1beta/models")
+async def gemini_list_models(request: Request):
+    if request.headers.get("x-goog-api-key", "").startswith("bad"):
+        return gemini_error(400, "INVALID_ARGUMENT", "API key not valid. Please pass a valid API key.", reason="API_KEY_INVALID")
+    return {"models": [{"name": "models/gemini-fake", "supportedGenerationMethods": ["generateContent"]}]}
+
+
+@app.post("/v1beta/models/{target}")
+async def gemini_generate(target: str, request: Request):
+    stats["gemini_requests"] += 1
+    model, _, method = target.partition(":")
+    if method not in ("generateContent", "streamGenerateContent"):
+        return gemini_error(404, "NOT_FOUND", f"Method {method} not found for model {model}.")
+    body = await request.json()
+    if request.headers.get("x-goog-api-key", "").startswith("bad"):
+        return gemini_error(400, "INVALID_ARGUMENT", "API key not valid. Please pass a valid API key.", reason="API_KEY_INVALID")
+    if roll(config.rate_limit_rate):
+        stats["rate_limited"] += 1
+        return gemini_error(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).",
+                            headers={"retry-after": str(config.retry_after_seconds)})
+    if roll(config.server_error_rate):
+        stats["server_errors"] += 1
+        return gemini_error(503, "UNAVAILABLE", "The model is overloaded. Please try again later.")
+
+    max_tokens = int((body.get("generationConfig") or {}).get("maxOutputTokens", 1024))
+    output_count = min(config.output_tokens, max_tokens)
+    finish_reason = "STOP" if config.output_tokens <= max_tokens else "MAX_TOKENS"
+    usage = {"promptTokenCount": count_tokens(json.dumps(body)), "candidatesTokenCount": output_count}
+    usage["totalTokenCount"] = usage["promptTokenCount"] + output_count
+    tokens = fake_tokens(output_count)
+
+    if roll(config.blocked_rate):
+        stats["blocked"] += 1
+        await wait_first_token()
+        blocked = {"promptFeedback": {"blockReason": "SAFETY"}, "usageMetadata": usage}
+        if method == "generateContent":
+            return blocked
+        return StreamingResponse(iter([f"data: {json.dumps(blocked)}\r\n\r\n"]), media_type="text/event-stream")
+
+    if method == "generateContent":
+        await wait_first_token()
+        await wait_tokens(output_count)
+        return gemini_chunk("".join(tokens), finish_reason, usage)
+
+    async def events():
+        await wait_first_token()
+        for start in range(0, output_count, config.tokens_per_chunk):
+            chunk = tokens[start:start + config.tokens_per_chunk]
+            last = start + config.tokens_per_chunk >= output_count
+            yield f"data: {json.dumps(gemini_chunk(''.join(chunk), finish_reason if last else None, usage if last else None))}\r\n\r\n"
+            await wait_tokens(len(chunk))
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Anthropic + Gemini API server for offline benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    for name, default in asdict(FakeConfig()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args()
+    global rng
+    for name in asdict(config):
+        setattr(config, name, getattr(args, name))
+    rng = random.Random(config.seed or None)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+# Repeatable load test for the Python backend. Drives the backend's endpoints at fixed concurrency levels and
+# reports throughput and p50/p95/p99 latency (plus time to first token for streamed scenarios).
+#
+# Fully offline run - starts the fake providers and a backend wired to them, then benchmarks it:
+#   cd python_server
+#   python bench/load_test.py --spawn --scenarios generate,stream,batch,job,validate-anthropic,validate-google --concurrency 1,8,32
+#
+# Against an already running backend (whatever it points at):
+#   python bench/load_test.py --target http://127.0.0.1:8000 --scenarios generate --model gemini-2.0-flash
+#
+# --fake-config passes FakeConfig overrides to the spawned fake server, e.g. '{"rate_limit_rate": 0.1}'.
+# --json writes the results so runs before/after a change can be compared.
+
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class Sample:
+    ok: bool
+    latency: float
+    status: int = 0
+    ttft: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    concurrency: int
+    requests: int
+    ok: int
+    errors: int
+    wall_seconds: float
+    throughput_rps: float
+    latency_ms: Dict[str, float]
+    ttft_ms: Optional[Dict[str, float]] = None
+    error_samples: List[str] = field(default_factory=list)
+
+
+ScenarioFn = Callable[[httpx.AsyncClient, argparse.Namespace, int], Awaitable[Sample]]
+SCENARIOS: Dict[str, ScenarioFn] = {}
+
+
+def scenario(name: str):
+    def register(fn: ScenarioFn) -> ScenarioFn:
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+def script_body(args, index: int) -> dict:
+    return {
+        "prompt": f"Benchmark request {index}: a short scene in an editing suite.",
+        "model_identifier": args.model,
+        "api_key": args.api_key,
+        "cache": "bypass", # Measure the provider path, not the generation cache
+        "priority": "interactive",
+    }
+
+
+def sample_from_json(response: httpx.Response, started: float) -> Sample:
+    latency = time.perf_counter() - started
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+    ok = response.status_code == 200 and payload.get("success") is True
+    return Sample(ok, latency, response.status_code, error=None if ok else str(payload.get("error") or response.status_code))
+
+
+@scenario("generate")
+async def generate_scenario(client, args, index):
+    started = time.perf_counter()
+    response = await client.post("/generate-script", json=script_body(args, index))
+    return sample_from_json(response, started)
+
+
+async def read_event_stream(client, path: str, body: dict, started: float, first_event_type: str) -> Sample:
+    # Streams NDJSON; TTFT is measured to the first event of first_event_type.
+    ttft = None
+    terminal = None
+    async with client.stream("POST", path, params={"format": "ndjson"}, json=body) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return sample_from_json(response, started)
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["type"] == first_event_type and ttft is None:
+                ttft = time.perf_counter() - started
+            if event["type"] in ("done", "error"):
+                terminal = event
+    latency = time.perf_counter() - started
+    ok = terminal is not None and terminal.get("success") is True
+    return Sample(ok, latency, response.status_code, ttft, None if ok else str((terminal or {}).get("error", "stream ended early")))
+
+
+@scenario("stream")
+async def stream_scenario(client, args, index):
+    return await read_event_stream(client, "/generate-script/stream", script_body(args, index), time.perf_counter(), "delta")
+
+
+@scenario("batch")
+async def batch_scenario(client, args, index):
+    body = script_body(args, index)
+    body["jobs"] = [{"prompt": f"{body['prompt']} Variant {n}."} for n in range(args.batch_size)]
+    body["priority"] = "batch"
+    del body["prompt"]
+    sample = await read_event_stream(client, "/generate-script/batch", body, time.perf_counter(), "result")
+    return sample
+
+
+@scenario("job")
+async def job_scenario(client, args, index):
+    # Submit to the background job queue, then follow its event stream until it finishes.
+    started = time.perf_counter()
+    body = script_body(args, index)
+    body["priority"] = "background"
+    response = await client.post("/jobs", json=body)
+    if response.status_code != 202:
+        return sample_from_json(response, started)
+    job_id = response.json()["data"]["id"]
+    ttft = None
+    terminal = None
+    async with client.stream("GET", f"/jobs/{job_id}/events", params={"format": "ndjson"}) as events:
+        async for line in events.aiter_lines():
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["type"] == "delta" and ttft is None:
+                ttft = time.perf_counter() - started
+            if event["type"] == "done":
+                terminal = event
+    latency = time.perf_counter() - started
+    ok = terminal is not None and terminal.get("success") is True
+    error = None if ok else str(((terminal or {}).get("data") or {}).get("result", {}).get("error", "stream ended early"))
+    return Sample(ok, latency, response.status_code, ttft, error)
+
+
+async def validate(client, path: str, args) -> Sample:
+    started = time.perf_counter()
+    # force=true skips the validation cache so every request reaches the provider.
+    response = await client.post(path, json={"api_key": args.api_key, "force": True})
+    return sample_from_json(response, started)
+
+
+@scenario("validate-anthropic")
+async def validate_anthropic_scenario(client, args, index):
+    return await validate(client, "/validate-anthropic-key", args)
+
+
+@scenario("validate-google")
+async def validate_google_scenario(client, args, index):
+    return await validate(client, "/validate-google-key", args)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    # Nearest-rank percentiles, in milliseconds.
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] * 1000
+
+    return {
+        "p50": round(rank(50), 1), "p95": round(rank(95), 1), "p99": round(rank(99), 1),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 1), "max": round(ordered[-1] * 1000, 1),
+    }
+
+
+async def run_level(client, name: str, args, concurrency: int) -> ScenarioResult:
+    fn = SCENARIOS[name]
+    total = args.requests
+    next_index = iter(range(total))
+    samples: List[Sample] = []
+
+    async def worker():
+        for index in next_index:
+            started = time.perf_counter()
+            try:
+                samples.append(await fn(client, args, index))
+            except httpx.HTTPError as e:
+                samples.append(Sample(False, time.perf_counter() - started, error=f"{type(e).__name__}: {e}"))
+
+    wall_started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall_started
+
+    ok_samples = [s for s in samples if s.ok]
+    ttfts = [s.ttft for s in ok_samples if s.ttft is not None]
+    return ScenarioResult(
+        scenario=name,
+        concurrency=concurrency,
+        requests=len(samples),
+        ok=len(ok_samples),
+        errors=len(samples) - len(ok_samples),
+        wall_seconds=round(wall, 3),
+        throughput_rps=round(len(ok_samples) / wall, 2) if wall else 0.0,
+        latency_ms=percentiles([s.latency for s in ok_samples]),
+        ttft_ms=percentiles(ttfts) if ttfts else None,
+        error_samples=sorted({s.error for s in samples if s.error})[:5],
+    )
+
+
+def print_table(results: List[ScenarioResult]):
+    header = f"{'scenario':<20}{'conc':>5}{'reqs':>6}{'ok':>6}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ttft p50':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        lat = r.latency_ms or {}
+        ttft = (r.ttft_ms or {}).get("p50", "")
+        print(f"{r.scenario:<20}{r.concurrency:>5}{r.requests:>6}{r.ok:>6}{r.errors:>5}{r.throughput_rps:>9}"
+              f"{lat.get('p50', ''):>10}{lat.get('p95', ''):>10}{lat.get('p99', ''):>10}{ttft:>10}")
+        for error in r.error_samples:
+            print(f"    error: {error}")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def spawn_servers(args) -> List[subprocess.Popen]:
+    fake_port, backend_port = free_port(), free_port()
+    fake = subprocess.Popen([sys.executable, os.path.join(SERVER_DIR, "bench", "fake_providers.py"), "--port", str(fake_port)], cwd=SERVER_DIR)
+    env = {
+        **os.environ,
+        "ANTHROPIC_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "GEMINI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1beta",
+        "AI_VIDEO_EDITOR_DATA_DIR": tempfile.mkdtemp(prefix="ave-bench-"),
+        "GENERATION_CACHE_PERSIST": "0",
+    }
+    backend = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(backend_port), "--log-level", "warning"],
+                               cwd=SERVER_DIR, env=env)
+    processes = [fake, backend]
+    try:
+        await wait_until_up(f"http://127.0.0.1:{fake_port}/_stats")
+        await wait_until_up(f"http://127.0.0.1:{backend_port}/ping")
+        if args.fake_config:
+            async with httpx.AsyncClient() as client:
+                await client.post(f"http://127.0.0.1:{fake_port}/_config", json=json.loads(args.fake_config))
+    except Exception:
+        for process in processes:
+            process.terminate()
+        raise
+    args.target = f"http://127.0.0.1:{backend_port}"
+    return processes
+
+
+async def main_async(args) -> List[ScenarioResult]:
+    processes = await spawn_servers(args) if args.spawn else []
+    results = []
+    try:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+            for name in args.scenarios:
+                for concurrency in args.concurrency:
+                    if args.warmup:
+                        await run_level(client, name, argparse.Namespace(**{**vars(args), "requests": min(args.warmup, args.requests)}), concurrency)
+                    results.append(await run_level(client, name, args, concurrency))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the AI video editor Python backend.")
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="Backend base URL (ignored with --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="Start fake providers and a backend wired to them")
+    parser.add_argument("--fake-config", help="JSON FakeConfig overrides for the spawned fake server")
+    parser.add_argument("--scenarios", default="generate,stream", help=f"Comma-separated: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests before each level")
+    parser.add_argument("--model", default="claude-3-haiku-20240307")
+    parser.add_argument("--api-key", default="bench-key")
+    parser.add_argument("--batch-size", type=int, default=5, help="Jobs per request in the batch scenario")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(main_async(args))
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"target": args.target, "model": args.model, "results": [asdict(r) for r in results]}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_VERSION = 1 # Bump when the shape of cached values changes, so old entries stop matching
+TOUCH_BATCH_SIZE = 32 # Memory-tier hits are copied to the disk tier's last_access this many at a time
+
+
+def make_cache_key(model_id: str, system_prompt: str, prompt: str, params: dict) -> str:
+    # API keys are deliberately not part of the key: the same request gives the same script whoever pays for it.
+    material = json.dumps(
+        {"v": CACHE_KEY_VERSION, "model": model_id, "system": system_prompt, "prompt": prompt, "params": params},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _DiskStore:
+    # SQLite-backed tier. All methods are blocking and are run via asyncio.to_thread by GenerationCache.
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None # Opened on first use, so importing the server doesn't touch the disk
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str):
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            return json.loads(row[0]), row[1]
+
+    def touch(self, accessed: Dict[str, float]):
+        with self._lock:
+            conn = self._connection()
+            self._touch_locked(conn, accessed)
+            conn.commit()
+
+    def _touch_locked(self, conn: sqlite3.Connection, accessed: Dict[str, float]):
+        conn.executemany("UPDATE entries SET last_access = ? WHERE key = ?", [(at, key) for key, at in accessed.items()])
+
+    def put(self, key: str, value: dict, created_at: float, accessed: Optional[Dict[str, float]] = None) -> int:
+        # accessed: pending memory-tier hits, applied before eviction so hot entries aren't the ones dropped.
+        encoded = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            conn = self._connection()
+            if accessed:
+                self._touch_locked(conn, accessed)
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, len(encoded.encode("utf-8")), created_at, time.time()),
+            )
+            evicted = self._evict_locked(conn)
+            conn.commit()
+            return evicted
+
+    def delete(self, key: str):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            conn.commit()
+
+    def _evict_locked(self, conn: sqlite3.Connection) -> int:
+        # Least-recently-used entries go first until the store fits in max_bytes again.
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        evicted = 0
+        while total > self.max_bytes:
+            row = conn.execute("SELECT key, size FROM entries ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+            total -= row[1]
+            evicted += 1
+        return evicted
+
+    def purge_expired(self, cutoff: float) -> int:
+        with self._lock:
+            conn = self._connection()
+            deleted = conn.execute("DELETE FROM entries WHERE created_at < ?", (cutoff,)).rowcount
+            conn.commit()
+            return deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connection()
+            count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": size, "max_bytes": self.max_bytes}
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM entries")
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class GenerationCache:
+    """Two-tier (memory + optional SQLite on disk) LRU cache of completed generations.
+
+    Values are plain dicts (script, stop reason, token usage). Entries older than ttl_seconds are
+    treated as misses and dropped; ttl_seconds=None keeps them until LRU eviction.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_memory_entries: int = 256,
+                 max_disk_bytes: int = 50 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        self.max_memory_entries = max(1, max_memory_entries)
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict() # key -> (value, created_at)
+        self._disk = _DiskStore(path, max_disk_bytes) if path else None
+        self._accessed: Dict[str, float] = {} # Memory-tier hits not yet written to the disk tier's last_access
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, created_at = entry
+            if not self._expired(created_at):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                if self._disk is not None:
+                    self._accessed[key] = time.time()
+                    if len(self._accessed) >= TOUCH_BATCH_SIZE:
+                        await self._flush_accessed()
+                return value
+            del self._memory[key]
+
+        if self._disk is not None:
+            try:
+                row = await asyncio.to_thread(self._disk.get, key)
+            except sqlite3.Error:
+                logger.exception("Generation cache disk read failed; treating as a miss")
+                row = None
+            if row is not None:
+                value, created_at = row
+                if not self._expired(created_at):
+                    self._remember(key, value, created_at)
+                    self.hits += 1
+                    return value
+                await asyncio.to_thread(self._disk.delete, key)
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value: dict):
+        created_at = time.time()
+        self._remember(key, value, created_at)
+        self.writes += 1
+        if self._disk is not None:
+            accessed, self._accessed = self._accessed, {}
+            try:
+                self.evictions += await asyncio.to_thread(self._disk.put, key, value, created_at, accessed)
+            except sqlite3.Error:
+                logger.exception("Generation cache disk write failed; entry kept in memory only")
+
+    async def _flush_accessed(self):
+        accessed, self._accessed = self._accessed, {}
+        try:
+            await asyncio.to_thread(self._disk.touch, accessed)
+        except sqlite3.Error:
+            logger.exception("Generation cache disk touch failed")
+
+    def _remember(self, key: str, value: dict, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            if self._disk is None:
+                self.evictions += 1 # With a disk tier, falling out of memory isn't an eviction
+
+    async def purge_expired(self) -> int:
+        if self.ttl_seconds is None or self._disk is None:
+            return 0
+        return await asyncio.to_thread(self._disk.purge_expired, time.time() - self.ttl_seconds)
+
+    async def clear(self):
+        self._memory.clear()
+        self._accessed = {}
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.clear)
+
+    async def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "max_memory_entries": self.max_memory_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+        if self._disk is not None:
+            stats["disk"] = await asyncio.to_thread(self._disk.stats)
+        return stats
+
+    def close(self):
+        if self._disk is not None:
+            if self._accessed:
+                try:
+                    self._disk.touch(self._accessed)
+                except sqlite3.Error:
+                    logger.exception("Generation cache disk touch failed")
+                self._accessed = {}
+            self._disk.close()
@@ -0,0 +1,449 @@
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Durable background jobs: a generation runs detached from the HTTP request that submitted it, its
+# progress and result live in SQLite, and clients poll or subscribe by job id. A client timeout, window
+# reload or server restart no longer throws away a finished (or half-finished) generation.
+#
+# API keys are never written to disk: the submitter passes them as the job's in-memory secret. A job that was
+# queued or running when the server stopped is re-queued on startup only if it had no secret (it used the
+# providers' env vars); otherwise it is marked failed, keeping any partial output.
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+JobRunner = Callable[[dict, Optional[dict], Callable[[str], None]], Awaitable[Tuple[int, dict]]]
+
+
+class JobQueueFullError(Exception):
+    pass
+
+
+class _JobStore:
+    # SQLite-backed job table. All methods are blocking and are run via asyncio.to_thread by JobQueue.
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None # Opened on first use, so importing the server doesn't touch the disk
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, priority INTEGER NOT NULL,"
+                " params TEXT NOT NULL, recoverable INTEGER NOT NULL, output TEXT NOT NULL DEFAULT '',"
+                " result TEXT, status_code INTEGER, attempts INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at)")
+            self._conn.commit()
+        return self._conn
+
+    def insert(self, job: dict):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, priority, params, recoverable, created_at)"
+                " VALUES (:id, :kind, :status, :priority, :params, :recoverable, :created_at)",
+                job,
+            )
+            conn.commit()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, status: Optional[str], limit: int) -> List[dict]:
+        query = ("SELECT id, kind, status, priority, params, status_code, attempts, created_at, started_at, finished_at,"
+                 " length(output) AS output_length FROM jobs")
+        args: tuple = ()
+        if status:
+            query += " WHERE status = ?"
+            args = (status,)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._connection().execute(query, args + (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def claim_next(self) -> Optional[dict]:
+        # Highest priority (lowest number), then oldest, queued job becomes running.
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1, output = '' WHERE id = ?",
+                (time.time(), row["id"]),
+            )
+            conn.commit()
+            return dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def save_output(self, job_id: str, output: str):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("UPDATE jobs SET output = ? WHERE id = ? AND status = 'running'", (output, job_id))
+            conn.commit()
+
+    def finish(self, job_id: str, status: str, output: str, status_code: Optional[int], result: Optional[dict]):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE jobs SET status = ?, output = ?, status_code = ?, result = ?, finished_at = ? WHERE id = ?",
+                (status, output, status_code, json.dumps(result) if result is not None else None, time.time(), job_id),
+            )
+            conn.commit()
+
+    def cancel_queued(self, job_id: str) -> bool:
+        with self._lock:
+            conn = self._connection()
+            updated = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'", (time.time(), job_id)
+            ).rowcount
+            conn.commit()
+            return updated > 0
+
+    def delete_finished(self, job_id: str) -> bool:
+        with self._lock:
+            conn = self._connection()
+            deleted = conn.execute(
+                f"DELETE FROM jobs WHERE id = ? AND status IN {FINISHED_STATUSES}", (job_id,)
+            ).rowcount
+            conn.commit()
+            return deleted > 0
+
+    def recover(self, max_attempts: int) -> Tuple[List[dict], int]:
+        # Returns (re-queued jobs, number marked failed) for jobs left active by the previous process.
+        interrupted = {"success": False, "error": "Job was interrupted by a server restart and could not be resumed "
+                       "(API keys are not stored on disk); resubmit it.", "data": {"error_type": "JobInterrupted"}}
+        crashed = {"success": False, "error": f"Job was interrupted {max_attempts} times; giving up.",
+                   "data": {"error_type": "JobInterrupted"}}
+        with self._lock:
+            conn = self._connection()
+            rows = [dict(row) for row in conn.execute(
+                "SELECT id, kind, params, priority, recoverable, attempts, created_at FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()]
+            requeued, failed = [], 0
+            for row in rows:
+                if row["recoverable"] and row["attempts"] < max_attempts:
+                    conn.execute("UPDATE jobs SET status = 'queued', output = '', started_at = NULL WHERE id = ?", (row["id"],))
+                    requeued.append(row)
+                else:
+                    result = interrupted if not row["recoverable"] else crashed
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', status_code = 503, result = ?, finished_at = ? WHERE id = ?",
+                        (json.dumps(result), time.time(), row["id"]),
+                    )
+                    failed += 1
+            conn.commit()
+        return requeued, failed
+
+    def purge_finished(self, cutoff: float) -> int:
+        with self._lock:
+            conn = self._connection()
+            deleted = conn.execute(
+                f"DELETE FROM jobs WHERE status IN {FINISHED_STATUSES} AND finished_at < ?", (cutoff,)
+            ).rowcount
+            conn.commit()
+            return deleted
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+@dataclass
+class _LiveJob:
+    # In-memory side of a queued or running job: its key, streamed output and a change notification.
+    id: str
+    secret: Optional[dict]
+    status: str = "queued"
+    parts: List[str] = field(default_factory=list)
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+    finishing: bool = False # Result is being stored; the task must not be cancelled any more
+    dirty: bool = False
+    cancel_requested: bool = False # Cancelled between being claimed and its task starting
+
+    def notify(self):
+        # Wake every current subscriber; later waiters get a fresh event.
+        event, self.changed = self.changed, asyncio.Event()
+        event.set()
+
+
+class JobQueue:
+    """Persistent queue of generation jobs with a fixed number of workers.
+
+    runner(params, secret, on_delta) does the actual work and returns (HTTP status, response payload) in the
+    same shape as the synchronous endpoints; on_delta is called with each chunk of output as it arrives.
+    secret is whatever was passed to submit() (e.g. API keys) and only ever held in memory.
+    """
+
+    def __init__(self, path: str, runner: JobRunner, max_workers: int = 2, retention_seconds: float = 7 * 24 * 3600,
+                 flush_interval_seconds: float = 1.0, max_queued: int = 1000, max_attempts: int = 3):
+        self._store = _JobStore(path)
+        self._runner = runner
+        self.max_workers = max(1, max_workers)
+        self.retention_seconds = retention_seconds
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self._live: Dict[str, _LiveJob] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+        self.completed = {status: 0 for status in FINISHED_STATUSES}
+
+    async def start(self):
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        requeued, failed = await asyncio.to_thread(self._store.recover, self.max_attempts)
+        for row in requeued:
+            self._live[row["id"]] = _LiveJob(row["id"], None)
+        if requeued or failed:
+            logger.info(f"Job recovery: {len(requeued)} re-queued, {failed} marked failed")
+        await self.purge_finished()
+        self._wakeup.set()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+        self._tasks.append(asyncio.create_task(self._janitor()))
+
+    async def close(self):
+        # Running jobs are left as "running" in the store; the next start() re-queues or fails them.
+        self._closing = True
+        running = [live.task for live in self._live.values() if live.task is not None]
+        for task in self._tasks:
+            task.cancel()
+        for live in self._live.values():
+            if live.task is not None and not live.finishing:
+                live.task.cancel()
+        await asyncio.gather(*self._tasks, *running, return_exceptions=True)
+        self._tasks = []
+        self._live.clear()
+        self._store.close()
+
+    async def submit(self, kind: str, params: dict, secret: Optional[dict], priority: int) -> dict:
+        queued = sum(1 for live in self._live.values() if live.status == "queued")
+        if queued >= self.max_queued:
+            raise JobQueueFullError(f"{queued} jobs are already queued; the limit is {self.max_queued}.")
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._store.insert, {
+            "id": job_id, "kind": kind, "status": "queued", "priority": priority, "params": json.dumps(params),
+            # Jobs that carry their own key can't be resumed after a restart, since the key isn't persisted.
+            "recoverable": int(secret is None), "created_at": time.time(),
+        })
+        self._live[job_id] = _LiveJob(job_id, secret)
+        self._wakeup.set()
+        return await self.get(job_id)
+
+    async def get(self, job_id: str, offset: int = 0) -> Optional[dict]:
+        row = await asyncio.to_thread(self._store.get, job_id)
+        if row is None:
+            return None
+        live = self._live.get(job_id)
+        if live is not None and row["status"] == "running":
+            row["output"] = "".join(live.parts) # Fresher than the periodically flushed copy
+        return self._describe(row, offset)
+
+    async def list(self, status: Optional[str] = None, limit: int = 50) -> List[dict]:
+        rows = await asyncio.to_thread(self._store.list, status, max(1, min(limit, 500)))
+        return [self._describe(row) for row in rows]
+
+    async def cancel(self, job_id: str) -> Optional[dict]:
+        live = self._live.get(job_id)
+        if live is not None and live.task is not None:
+            if not live.finishing: # Otherwise it already has a result; wait for that to be stored
+                live.task.cancel()
+            await asyncio.wait({live.task})
+        elif await asyncio.to_thread(self._store.cancel_queued, job_id):
+            self.completed["cancelled"] += 1
+            if live is not None:
+                self._finish_live(live, "cancelled")
+        elif live is not None:
+            live.cancel_requested = True
+        return await self.get(job_id)
+
+    async def delete(self, job_id: str) -> bool:
+        # Only finished jobs can be deleted; cancel active ones first.
+        return await asyncio.to_thread(self._store.delete_finished, job_id)
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[Tuple[str, dict]]:
+        """Yields ("status", job), then ("delta", {"text"}) chunks of output as they arrive (including what
+        was produced before subscribing), and finally ("done", job) once the job has finished."""
+        job = await self.get(job_id)
+        if job is None:
+            return
+        yield "status", {key: value for key, value in job.items() if key != "output"}
+        live = self._live.get(job_id)
+        if live is None:
+            job = await self.get(job_id) # May have finished since the snapshot above
+            if job is not None and job["output"]:
+                yield "delta", {"text": job["output"]}
+        else:
+            sent = 0
+            status = job["status"]
+            while True:
+                changed = live.changed
+                if len(live.parts) > sent:
+                    yield "delta", {"text": "".join(live.parts[sent:])}
+                    sent = len(live.parts)
+                if live.status != status:
+                    status = live.status
+                    if status in ACTIVE_STATUSES:
+                        yield "status", {"id": job_id, "status": status}
+                if status in FINISHED_STATUSES:
+                    break
+                await changed.wait()
+        final = await self.get(job_id)
+        if final is not None:
+            yield "done", {key: value for key, value in final.items() if key != "output"}
+
+    async def purge_finished(self) -> int:
+        if self.retention_seconds is None:
+            return 0
+        purged = await asyncio.to_thread(self._store.purge_finished, time.time() - self.retention_seconds)
+        if purged:
+            logger.info(f"Purged {purged} finished jobs past the retention period")
+        return purged
+
+    async def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "queued": sum(1 for live in self._live.values() if live.status == "queued"),
+            "running": sum(1 for live in self._live.values() if live.status == "running"),
+            "completed": dict(self.completed),
+            "stored": await asyncio.to_thread(self._store.counts),
+            "retention_seconds": self.retention_seconds,
+        }
+
+    def active_counts(self) -> Dict[str, int]:
+        # Synchronous, for scrape-time metrics.
+        counts = {status: 0 for status in ACTIVE_STATUSES}
+        for live in self._live.values():
+            counts[live.status] = counts.get(live.status, 0) + 1
+        return counts
+
+    def _describe(self, row: dict, offset: int = 0) -> dict:
+        job = {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "params": json.loads(row["params"]),
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+        if "output" in row:
+            output = row["output"] or ""
+            job["output_length"] = len(output)
+            job["output"] = output[max(0, offset):] # Pollers pass the length they already have
+        else:
+            job["output_length"] = row.get("output_length") or 0
+        if row.get("status_code") is not None:
+            job["status_code"] = row["status_code"]
+        if row.get("result"):
+            job["result"] = json.loads(row["result"])
+        return job
+
+    def _finish_live(self, live: _LiveJob, status: str):
+        live.status = status
+        self._live.pop(live.id, None)
+        live.notify()
+
+    async def _worker(self):
+        while True:
+            self._wakeup.clear() # Cleared before claiming, so a submit racing with an empty claim isn't missed
+            row = await asyncio.to_thread(self._store.claim_next)
+            if row is None:
+                await self._wakeup.wait()
+                continue
+            self._wakeup.set() # Let idle workers look for more
+            live = self._live.get(row["id"])
+            if live is None: # Queued by a previous process and not recoverable in memory; shouldn't happen after recover()
+                live = self._live[row["id"]] = _LiveJob(row["id"], None)
+            if live.cancel_requested:
+                await asyncio.to_thread(self._store.finish, live.id, "cancelled", "", None,
+                                        {"success": False, "error": "Job was cancelled.", "data": {"error_type": "JobCancelled"}})
+                self.completed["cancelled"] += 1
+                self._finish_live(live, "cancelled")
+                continue
+            live.status = "running"
+            live.notify()
+            live.task = asyncio.create_task(self._run(live, json.loads(row["params"])))
+            await asyncio.wait({live.task})
+
+    async def _run(self, live: _LiveJob, params: dict):
+        def on_delta(text: str):
+            live.parts.append(text)
+            live.dirty = True
+            live.notify()
+
+        flusher = asyncio.create_task(self._flush_output(live))
+        status, status_code, payload = "failed", None, None
+        try:
+            status_code, payload = await self._runner(params, live.secret, on_delta)
+            status = "succeeded" if status_code == 200 and payload.get("success") else "failed"
+            if status == "succeeded":
+                script = (payload.get("data") or {}).get("script")
+                if script is not None and script != "".join(live.parts):
+                    live.parts[:] = [script] # e.g. a cache hit, or a runner that doesn't stream
+        except asyncio.CancelledError:
+            if self._closing:
+                flusher.cancel()
+                await asyncio.gather(flusher, return_exceptions=True)
+                await asyncio.to_thread(self._store.save_output, live.id, "".join(live.parts))
+                raise
+            status, status_code, payload = "cancelled", None, {"success": False, "error": "Job was cancelled.", "data": {"error_type": "JobCancelled"}}
+        except Exception as e:
+            logger.exception(f"Job {live.id} failed unexpectedly:")
+            status_code, payload = 500, {"success": False, "error": f"Job failed: {type(e).__name__} - {e}", "data": {"error_type": type(e).__name__}}
+        finally:
+            flusher.cancel()
+        live.finishing = True # From here on cancel() waits instead, so the result is always stored and published
+        await asyncio.gather(flusher, return_exceptions=True)
+        await asyncio.to_thread(self._store.finish, live.id, status, "".join(live.parts), status_code, payload)
+        self.completed[status] += 1
+        self._finish_live(live, status)
+
+    async def _flush_output(self, live: _LiveJob):
+        # Periodically persists partial output, so a crash or restart keeps what was already generated.
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            if live.dirty:
+                live.dirty = False
+                await asyncio.to_thread(self._store.save_output, live.id, "".join(live.parts))
+
+    async def _janitor(self):
+        interval = min(3600.0, max(60.0, (self.retention_seconds or 3600.0) / 10))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.purge_finished()
+            except sqlite3.Error:
+                logger.exception("Job retention purge failed")
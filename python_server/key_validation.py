@@ -0,0 +1,94 @@
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import time
+
+# A check returns the response payload for the validate endpoint plus a verdict:
+# True (key works), False (key rejected by the provider) or None (couldn't tell - network, 5xx, rate limit...).
+# Only True/False verdicts are cached.
+KeyCheck = Callable[[str], Awaitable[Tuple[dict, Optional[bool]]]]
+
+
+def key_fingerprint(provider_name: str, api_key: str) -> str:
+    # Raw keys are never stored; entries are addressed by a hash of provider + key.
+    return hashlib.sha256(f"{provider_name}:{api_key}".encode("utf-8")).hexdigest()
+
+
+class _CachedVerdict:
+    def __init__(self, valid: bool, response: dict, expires_at: float):
+        self.valid = valid
+        self.response = response
+        self.expires_at = expires_at
+
+
+class KeyValidator:
+    """Caches API key validation results and collapses concurrent checks of the same key into one call."""
+
+    def __init__(self, valid_ttl_seconds: float = 6 * 3600, invalid_ttl_seconds: float = 15 * 60):
+        self.valid_ttl_seconds = valid_ttl_seconds
+        self.invalid_ttl_seconds = invalid_ttl_seconds
+        self._verdicts: Dict[str, _CachedVerdict] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0 # Callers that joined a validation already in flight
+
+    def _cached(self, fingerprint: str) -> Optional[_CachedVerdict]:
+        verdict = self._verdicts.get(fingerprint)
+        if verdict is not None and verdict.expires_at <= time.monotonic():
+            del self._verdicts[fingerprint]
+            return None
+        return verdict
+
+    def _store(self, fingerprint: str, valid: bool, response: dict):
+        now = time.monotonic()
+        ttl = self.valid_ttl_seconds if valid else self.invalid_ttl_seconds
+        self._verdicts[fingerprint] = _CachedVerdict(valid, response, now + ttl)
+        # Drop anything that has expired so the table can't grow without bound.
+        for stale in [fp for fp, v in self._verdicts.items() if v.expires_at <= now]:
+            del self._verdicts[stale]
+
+    async def validate(self, provider_name: str, api_key: str, check: KeyCheck, force: bool = False) -> dict:
+        fingerprint = key_fingerprint(provider_name, api_key)
+        if not force:
+            verdict = self._cached(fingerprint)
+            if verdict is not None:
+                self.hits += 1
+                return {**verdict.response, "cached": True}
+
+        task = self._inflight.get(fingerprint)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(self._run_check(fingerprint, api_key, check))
+            self._inflight[fingerprint] = task
+        else:
+            self.shared += 1
+        # Shielded so one caller going away doesn't cancel the check the others are waiting on.
+        response = await asyncio.shield(task)
+        return {**response, "cached": False}
+
+    async def _run_check(self, fingerprint: str, api_key: str, check: KeyCheck) -> dict:
+        try:
+            response, valid = await check(api_key)
+            if valid is not None:
+                self._store(fingerprint, valid, response)
+            return response
+        finally:
+            self._inflight.pop(fingerprint, None)
+
+    def known_invalid(self, provider_name: str, api_key: str) -> bool:
+        verdict = self._cached(key_fingerprint(provider_name, api_key))
+        return verdict is not None and not verdict.valid
+
+    def record_invalid(self, provider_name: str, api_key: str, error_message: str):
+        # Called when a generation call is rejected for auth, so the next one can fail fast.
+        self._store(key_fingerprint(provider_name, api_key), False, {"success": False, "error": error_message})
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "cached_keys": len(self._verdicts),
+            "inflight": len(self._inflight),
+        }
@@ -1,26 +1,193 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from pydantic import BaseModel
 import os
-import anthropic
-from typing import Optional
+import time
+import asyncio
+import anyio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Literal, Optional, Tuple
 import json # For parsing error response
-import google.generativeai as genai # Added for Gemini
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import logging # Added for more detailed logging
 
-app = FastAPI()
+from providers import (
+    ClientPool, GenerationResult, Provider, ProviderAuthError, ProviderConnectionError, ProviderError,
+    get_provider_for_model, load_provider, load_provider_for_model, registry as provider_registry,
+)
+from generation_cache import GenerationCache, make_cache_key
+from jobs import JobQueue, JobQueueFullError
+from key_validation import KeyValidator
+from scheduler import PRIORITIES, ProviderScheduler, estimate_tokens, is_retryable
+from routing import HealthTracker, RouteError, Router
+from screenplay import build_scene_prompt, parse_script, splice_scene
+import metrics
+
 logger = logging.getLogger(__name__) # Added logger instance
 logging.basicConfig(level=logging.INFO) # Basic config for logging
 
+DEFAULT_MAX_TOKENS = 2048
+BATCH_MAX_JOBS = int(os.environ.get("BATCH_MAX_JOBS", "50"))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "8"))
+SCENE_MAX_TOKENS = int(os.environ.get("SCENE_MAX_TOKENS", "4096")) # Ceiling for a single scene edit
+
+# Where the backend keeps local state (generation cache, ...). The Electron app can point this at its userData dir.
+DATA_DIR = os.environ.get("AI_VIDEO_EDITOR_DATA_DIR", os.path.join(os.path.expanduser("~"), ".ai-video-editor"))
+
+def env_flag(name: str, default: str) -> bool:
+    return os.environ.get(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+# Async provider clients, pooled per (provider, api key) so HTTP connections are reused across requests.
+client_pool = ClientPool(max_size=int(os.environ.get("PROVIDER_CLIENT_POOL_SIZE", "16")))
+
+# Cache of completed generations keyed by model + system prompt + prompt + generation params.
+# Memory tier in front of a SQLite tier that survives restarts; set GENERATION_CACHE_ENABLED=0 to turn it off.
+# Requests opt in with cache="use" (or "refresh"); the default "bypass" always asks the model for a fresh take.
+generation_cache = None
+if env_flag("GENERATION_CACHE_ENABLED", "1"):
+    _cache_ttl = os.environ.get("GENERATION_CACHE_TTL_SECONDS")
+    generation_cache = GenerationCache(
+        path=os.path.join(DATA_DIR, "generation_cache.sqlite3") if env_flag("GENERATION_CACHE_PERSIST", "1") else None,
+        max_memory_entries=int(os.environ.get("GENERATION_CACHE_MEMORY_ENTRIES", "256")),
+        max_disk_bytes=int(float(os.environ.get("GENERATION_CACHE_MAX_MB", "50")) * 1024 * 1024),
+        ttl_seconds=float(_cache_ttl) if _cache_ttl else None,
+    )
+
+# Validation verdicts cached by a hash of the key. Valid keys are rechecked rarely; rejected keys are kept
+# for a shorter time and let generation requests fail fast without a network call.
+key_validator = KeyValidator(
+    valid_ttl_seconds=float(os.environ.get("KEY_VALIDATION_VALID_TTL_SECONDS", str(6 * 3600))),
+    invalid_ttl_seconds=float(os.environ.get("KEY_VALIDATION_INVALID_TTL_SECONDS", str(15 * 60))),
+)
+
+# Admission limits per provider (and optionally per model), overridable with a PROVIDER_LIMITS JSON env var, e.g.
+# {"anthropic": {"max_concurrency": 8, "requests_per_minute": 50, "tokens_per_minute": 40000,
+#                "models": {"claude-3-opus-20240229": {"max_concurrency": 2}}}}
+DEFAULT_PROVIDER_LIMITS = {
+    "anthropic": {"max_concurrency": 8},
+    "gemini": {"max_concurrency": 8},
+}
+
+def load_provider_limits() -> dict:
+    limits = {provider: dict(config) for provider, config in DEFAULT_PROVIDER_LIMITS.items()}
+    overrides = os.environ.get("PROVIDER_LIMITS")
+    if overrides:
+        for provider, config in json.loads(overrides).items():
+            limits.setdefault(provider, {}).update(config)
+    return limits
+
+scheduler = ProviderScheduler(
+    load_provider_limits(),
+    max_retries=int(os.environ.get("SCHEDULER_MAX_RETRIES", "3")),
+    base_backoff_seconds=float(os.environ.get("SCHEDULER_BASE_BACKOFF_SECONDS", "1.0")),
+    max_backoff_seconds=float(os.environ.get("SCHEDULER_MAX_BACKOFF_SECONDS", "30.0")),
+    on_admit=lambda provider, model, priority, waited: metrics.observe_scheduler_wait(provider, priority, waited),
+)
+
+# Latency and error rates per provider/model, fed by every provider call and used to order routed requests.
+provider_health = HealthTracker(
+    failure_threshold=int(os.environ.get("ROUTING_FAILURE_THRESHOLD", "3")),
+    cooldown_seconds=float(os.environ.get("ROUTING_COOLDOWN_SECONDS", "30")),
+)
+router = Router(max_hedges=int(os.environ.get("ROUTING_MAX_HEDGES", "1")))
+ROUTING_DEFAULT_HEDGE_SECONDS = float(os.environ.get("ROUTING_DEFAULT_HEDGE_MS", "8000")) / 1000 # Until a model has latency data
+ROUTING_MIN_HEDGE_SECONDS = float(os.environ.get("ROUTING_MIN_HEDGE_MS", "500")) / 1000
+
+# Provider SDKs are imported on first use (see providers/registry.py) so /ping answers quickly after launch.
+# The warm-up then loads them in a worker thread shortly after startup, so the first generation doesn't
+# pay for the imports either. PROVIDER_WARMUP=0 leaves everything to first use.
+PROVIDER_WARMUP = env_flag("PROVIDER_WARMUP", "1")
+PROVIDER_WARMUP_DELAY_SECONDS = float(os.environ.get("PROVIDER_WARMUP_DELAY_SECONDS", "0.5"))
+
+async def warm_up():
+    # Startup finishes before uvicorn starts accepting connections; the delay lets the first /ping in first.
+    await asyncio.sleep(PROVIDER_WARMUP_DELAY_SECONDS)
+    if generation_cache is not None:
+        purged = await generation_cache.purge_expired()
+        if purged:
+            logger.info(f"Purged {purged} expired generation cache entries")
+    if PROVIDER_WARMUP:
+        timings = await asyncio.to_thread(provider_registry.load_all)
+        logger.info("Provider warm-up: " + ", ".join(
+            f"{name} {'failed' if seconds is None else f'{seconds * 1000:.0f} ms'}" for name, seconds in timings.items()))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_queue.start() # Re-queues or fails jobs left active by the previous process
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    await asyncio.gather(warm_up_task, return_exceptions=True)
+    await job_queue.close()
+    await client_pool.close_all()
+    if generation_cache is not None:
+        generation_cache.close()
+
+app = FastAPI(lifespan=lifespan)
+# Records latency/status per route; METRICS_TIMING_HEADER=1 adds a Server-Timing header to every response
+# (clients can also ask per request with "X-Request-Timing: 1").
+app.add_middleware(metrics.MetricsMiddleware, timing_header=env_flag("METRICS_TIMING_HEADER", "0"))
+
+# Optional multi-model routing for /generate-script. model_identifier is the first choice unless the health
+# tracker says otherwise; "models" lists equivalent fallbacks (Claude and Gemini can be mixed).
+class RoutingPolicy(BaseModel):
+    models: List[str] = []
+    api_keys: Dict[str, str] = {} # Provider name ("anthropic", "gemini") -> key, for fallbacks on another provider; env vars otherwise
+    strategy: Literal["ordered", "fastest"] = "ordered" # "fastest" orders by observed latency instead of list order
+    hedge: bool = False # Start the next model if the current one is slower than usual; first result wins
+    hedge_after_ms: Optional[int] = None # Fixed hedge delay; default is derived from the model's observed latency
+    max_attempts: Optional[int] = None # Cap on how many models are tried
+
 # Pydantic model for the request body of /generate-script
 class ScriptRequest(BaseModel):
     prompt: str
     model_identifier: str # e.g., 'claude-3-5-sonnet-20240620', 'gemini-2.5-pro-preview-05-06'
     api_key: Optional[str] = None
     system_prompt: Optional[str] = None # Added optional system_prompt
+    cache: Literal["use", "bypass", "refresh"] = "bypass" # "use" returns a stored script for an identical request, "refresh" regenerates and stores it
+    priority: Literal["interactive", "background", "batch"] = "interactive" # Queue position when providers are saturated
+    routing: Optional[RoutingPolicy] = None
+
+# A batch job overrides any of the batch-level defaults; unset fields fall back to them.
+class BatchJob(BaseModel):
+    prompt: Optional[str] = None
+    model_identifier: Optional[str] = None
+    api_key: Optional[str] = None
+    system_prompt: Optional[str] = None
+
+class BatchScriptRequest(BaseModel):
+    jobs: List[BatchJob]
+    prompt: Optional[str] = None
+    model_identifier: Optional[str] = None
+    api_key: Optional[str] = None
+    system_prompt: Optional[str] = None
+    cache: Literal["use", "bypass", "refresh"] = "bypass" # With "use", identical jobs come back as copies of one take
+    priority: Literal["interactive", "background", "batch"] = "batch"
+    max_concurrency: Optional[int] = None # Capped by BATCH_MAX_CONCURRENCY
+
+class ScriptParseRequest(BaseModel):
+    script: str # Markdown screenplay, as produced by /generate-script
+
+class SceneEditRequest(BaseModel):
+    script: str
+    scene_index: int # 0-based, as returned by /script/parse
+    mode: Literal["rewrite", "extend"] = "rewrite" # "extend" continues the scene instead of replacing it
+    instruction: str = ""
+    model_identifier: str
+    api_key: Optional[str] = None
+    system_prompt: Optional[str] = None
+    context_scenes: int = 2 # Neighbouring scenes on each side summarised into the prompt
+    max_tokens: Optional[int] = None # Default scales with the scene's length; capped by SCENE_MAX_TOKENS
+    cache: Literal["use", "bypass", "refresh"] = "bypass"
+    priority: Literal["interactive", "background", "batch"] = "interactive"
+
+# Same fields as /generate-script; jobs queue behind interactive requests by default.
+class JobRequest(ScriptRequest):
+    priority: Literal["interactive", "background", "batch"] = "background"
 
 class ApiKeyValidateRequest(BaseModel):
     api_key: str
+    force: bool = False # Skip the cached verdict and re-check with the provider
 
 SYSTEM_MESSAGE_SCRIPTING_ANTHROPIC = """You are an expert scriptwriter and creative assistant integrated into an AI video editing application. 
 Your primary task is to help the user generate and develop scripts based on user prompts.
@@ -57,6 +224,152 @@ Your primary task is to help the user generate and develop scripts based on user
 
 The user will be interacting with your generated Markdown script in a canvas-like text editor where they can further refine it with AI assistance. Your direct output will populate this editor. Be creative and helpful in generating compelling script content."""
 
+# Providers without an entry here use SYSTEM_MESSAGE_SCRIPTING_ANTHROPIC, which isn't Anthropic-specific.
+DEFAULT_SYSTEM_PROMPTS = {
+    "anthropic": SYSTEM_MESSAGE_SCRIPTING_ANTHROPIC,
+    "gemini": SYSTEM_MESSAGE_SCRIPTING_GEMINI,
+}
+
+SYSTEM_MESSAGE_SCENE_EDITING = """You are an expert scriptwriter editing a single scene of a longer screenplay inside an AI video editing application.
+You are given short summaries of the neighbouring scenes for continuity, the full text of the scene to work on, and an instruction.
+
+**Output Requirements:**
+*   Return ONLY the requested scene text in **Markdown** - no intros, explanations, or code fences.
+*   Do NOT write or repeat any other scene.
+*   Keep the screenplay conventions used by the rest of the script: `## INT.`/`## EXT.` scene headings with location and time of day, plain-text action paragraphs, character names in ALL CAPS before their dialogue, and parentheticals in parentheses on their own line between the character name and the dialogue.
+*   Stay consistent with the characters, names and events in the neighbouring scenes."""
+
+@dataclass
+class GenerationTarget:
+    provider: Provider
+    model_id: str
+    api_key: str
+    system_prompt: str
+
+class GenerationRequestError(Exception):
+    # A generation request refused before any provider call (unknown model, missing or known-bad key).
+    def __init__(self, status_code: int, payload: dict):
+        super().__init__(payload.get("error"))
+        self.status_code = status_code
+        self.payload = payload
+
+    def response(self) -> JSONResponse:
+        return JSONResponse(status_code=self.status_code, content=self.payload)
+
+async def resolve_generation_target(request: ScriptRequest) -> GenerationTarget:
+    # Raises GenerationRequestError when the model or key can't be resolved. A provider used for the first time
+    # is imported in a worker thread.
+    model_id = request.model_identifier
+    try:
+        provider = await load_provider_for_model(model_id)
+    except ProviderError as e: # The provider's SDK failed to import
+        logger.error(f"Could not load provider for model {model_id}: {e.message}")
+        raise GenerationRequestError(*provider_error_payload(e))
+    if provider is None:
+        logger.warning(f"Model identifier '{model_id}' not recognized for specific handling.")
+        raise GenerationRequestError(400, {"success": False, "error": f"Model '{model_id}' not supported by this endpoint yet."})
+
+    if not request.api_key:
+        logger.info(f"{provider.display_name} API key not provided in request, attempting to use {provider.env_var} from environment.")
+    key_to_use = provider.resolve_api_key(request.api_key)
+    if not key_to_use:
+        raise GenerationRequestError(200, {"success": False, "error": f"{provider.display_name} API key not found in request or {provider.env_var} environment variable."})
+    if key_validator.known_invalid(provider.name, key_to_use):
+        raise GenerationRequestError(401, {
+            "success": False,
+            "error": f"{provider.display_name} API key was recently rejected. Update it or re-validate it in settings.",
+            "data": {"error_type": "KnownInvalidKey"},
+        })
+
+    # Use custom system prompt if provided, else the provider's default
+    system_message_to_use = request.system_prompt or DEFAULT_SYSTEM_PROMPTS.get(provider.name, SYSTEM_MESSAGE_SCRIPTING_ANTHROPIC)
+    logger.info(f"Using system prompt for {provider.display_name}: {system_message_to_use[:100]}...") # Log first 100 chars
+    return GenerationTarget(provider, model_id, key_to_use, system_message_to_use)
+
+def generation_cache_key(request: ScriptRequest, target: GenerationTarget, max_tokens: int) -> Optional[str]:
+    # None means "don't touch the cache for this request".
+    if generation_cache is None or request.cache == "bypass":
+        return None
+    return make_cache_key(target.model_id, target.system_prompt, request.prompt, {"max_tokens": max_tokens})
+
+async def cached_generation(request: ScriptRequest, cache_key: Optional[str]) -> Optional[dict]:
+    if cache_key is None or request.cache != "use":
+        return None
+    return await generation_cache.get(cache_key)
+
+async def store_generation(cache_key: Optional[str], result: GenerationResult):
+    # Empty results are never cached; a retry should get another chance at real content.
+    if cache_key is None or not result.text:
+        return
+    await generation_cache.put(cache_key, {
+        "script": result.text,
+        "stop_reason": result.stop_reason,
+        "input_tokens": result.input_tokens,
+        "output_tokens": result.output_tokens,
+    })
+
+def provider_error_payload(e: ProviderError) -> Tuple[int, dict]:
+    return e.status_code, {"success": False, "error": e.message, "data": {"raw_error": e.raw_error, "error_type": e.error_type}}
+
+def unexpected_error_payload(e: Exception, model_id: str) -> Tuple[int, dict]:
+    provider = get_provider_for_model(model_id) # Already loaded: only called after the target was resolved
+    api_context = provider.display_name if provider else "Unknown API"
+    error_message = f"Unexpected LLM Server error ({api_context}): {type(e).__name__} - {str(e)}"
+    return 500, {"success": False, "error": error_message, "data": {"raw_error": str(e), "error_type": type(e).__name__}}
+
+@asynccontextmanager
+async def observed_call(target: GenerationTarget, operation: str):
+    # One upstream attempt: Prometheus metrics plus the routing health tracker. Only retryable failures count
+    # against a provider's health; a bad key or blocked prompt says nothing about the upstream.
+    started_at = time.perf_counter()
+    async with metrics.provider_call(target.provider.name, target.model_id, operation) as call_metrics:
+        try:
+            yield call_metrics
+        except Exception as e:
+            if is_retryable(e):
+                provider_health.observe(target.provider.name, target.model_id, time.perf_counter() - started_at, ok=False)
+            raise
+    provider_health.observe(target.provider.name, target.model_id, time.perf_counter() - started_at, ok=True)
+
+async def run_generation(target: GenerationTarget, prompt_text: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+                         priority: str = "interactive", max_retries: Optional[int] = None) -> GenerationResult:
+    async def call():
+        async with client_pool.lease(target.provider, target.api_key) as client:
+            logger.info(f"Attempting to generate content with {target.provider.display_name} model: {target.model_id}")
+            async with observed_call(target, "generate") as call_metrics:
+                result = await target.provider.generate(client, target.model_id, target.system_prompt, prompt_text, max_tokens)
+                call_metrics.usage(result)
+                return result
+
+    try:
+        return await scheduler.run(target.provider.name, target.model_id, call, priority,
+                                   estimate_tokens(target.system_prompt, prompt_text, max_tokens=max_tokens), max_retries)
+    except ProviderAuthError as e:
+        key_validator.record_invalid(target.provider.name, target.api_key, e.message)
+        raise
+
+async def leased_stream(target: GenerationTarget, prompt_text: str, max_tokens: int):
+    # The lease is held for the whole stream so the pooled client can't be closed underneath it.
+    async with client_pool.lease(target.provider, target.api_key) as client:
+        async with observed_call(target, "stream") as call_metrics:
+            async for item in target.provider.stream(client, target.model_id, target.system_prompt, prompt_text, max_tokens):
+                if isinstance(item, GenerationResult):
+                    call_metrics.usage(item)
+                else:
+                    call_metrics.first_token()
+                yield item
+
+async def stream_generation(target: GenerationTarget, prompt_text: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+                            priority: str = "interactive"):
+    try:
+        async for item in scheduler.stream(target.provider.name, target.model_id,
+                                           lambda: leased_stream(target, prompt_text, max_tokens), priority,
+                                           estimate_tokens(target.system_prompt, prompt_text, max_tokens=max_tokens)):
+            yield item
+    except ProviderAuthError as e:
+        key_validator.record_invalid(target.provider.name, target.api_key, e.message)
+        raise
+
 @app.get("/")
 async def read_root():
     return {"message": "Hello from Python FastAPI backend!"}
@@ -65,244 +378,652 @@ async def read_root():
 async def ping():
     return {"status": "ok", "message": "Python backend is alive!"}
 
+def provider_error_detail(e: ProviderError) -> str:
+    # Prefer the provider's own error message (e.g. "credit balance too low") over the generic status text.
+    raw_error = e.raw_error
+    if isinstance(raw_error, dict):
+        if isinstance(raw_error.get("error"), dict) and raw_error["error"].get("message"):
+            return raw_error["error"]["message"]
+        if raw_error.get("message"):
+            return raw_error["message"]
+    return e.message
+
+async def check_anthropic_key(api_key: str):
+    try:
+        provider = await load_provider("anthropic")
+        async with client_pool.lease(provider, api_key) as client:
+            async with metrics.provider_call(provider.name, "-", "validate"):
+                await provider.validate_key(client)
+        return {"success": True, "message": "Anthropic API Key is valid and has sufficient credits."}, True
+    except ProviderAuthError:
+        return {"success": False, "error": "Invalid Anthropic API Key (AuthenticationError)."}, False
+    except ProviderConnectionError:
+        return {"success": False, "error": "Could not connect to Anthropic API to validate key."}, None
+    except ProviderError as e:
+        logger.warning(f"Anthropic API Status Error during validation: status_code={e.status_code} response={e.raw_error}")
+        return {"success": False, "error": provider_error_detail(e)}, None
+    except Exception as e:
+        logger.exception(f"Unexpected validation error: {e}")
+        return {"success": False, "error": "Key validation failed due to an unexpected API error during the call."}, None
+
 @app.post("/validate-anthropic-key")
 async def validate_anthropic_key(request: ApiKeyValidateRequest):
     if not request.api_key:
         return {"success": False, "error": "No API key provided for validation."}
+    return await key_validator.validate("anthropic", request.api_key, check_anthropic_key, force=request.force)
+
+async def check_google_key(api_key: str):
     try:
-        client = anthropic.Anthropic(api_key=request.api_key)
-        # A light-weight call to check authentication, e.g., try to list models or a simple ping if available.
-        # For Anthropic, often just initializing the client with a bad key might not error until a real call.
-        # Let's try a very small message request as a validation method.
-        client.messages.create(
-            model="claude-3-haiku-20240307", # Use a known, cheap/fast model for validation
-            max_tokens=1,
-            messages=[{"role": "user", "content": "ping"}]
-        )
-        return {"success": True, "message": "Anthropic API Key is valid and has sufficient credits."}
-    except anthropic.AuthenticationError:
-        return {"success": False, "error": "Invalid Anthropic API Key (AuthenticationError)."}
-    except anthropic.APIConnectionError:
-        return {"success": False, "error": "Could not connect to Anthropic API to validate key."}
-    except anthropic.APIStatusError as e:
-        print(f"Anthropic API Status Error during validation: status_code={e.status_code} response={e.response}")
-        error_message = f"Anthropic API error: {e.status_code}."
-        try:
-            # Try to get more specific error message from Anthropic's response
-            if e.response and hasattr(e.response, 'text'):
-                error_detail = json.loads(e.response.text)
-                if error_detail.get('error') and error_detail['error'].get('message'):
-                    error_message = error_detail['error']['message']
-        except Exception:
-            pass # Stick to the generic status code error
-        return {"success": False, "error": error_message}
+        provider = await load_provider("gemini")
+        async with client_pool.lease(provider, api_key) as client:
+            async with metrics.provider_call(provider.name, "-", "validate"):
+                await provider.validate_key(client)
+        return {"success": True, "message": "Google API Key appears valid (successfully listed models)."}, True
+    except ProviderAuthError as e:
+        logger.warning(f"Google API authentication failed during validation: {e}")
+        return {"success": False, "error": f"Invalid Google API Key ({e.error_type})."}, False
+    except ProviderError as e:
+        logger.warning(f"Google API Error during validation: {e}")
+        return {"success": False, "error": f"Google API error during validation: {provider_error_detail(e)}."}, None
     except Exception as e:
-        print(f"Unexpected validation error: {e}")
-        return {"success": False, "error": "Key validation failed due to an unexpected API error during the call."}
+        logger.exception(f"Unexpected Google key validation error: {e}")
+        return {"success": False, "error": "Key validation failed due to an unexpected API error."}, None
 
 @app.post("/validate-google-key")
 async def validate_google_key_endpoint(request: ApiKeyValidateRequest):
     if not request.api_key:
         return {"success": False, "error": "No Google API key provided for validation."}
+    return await key_validator.validate("gemini", request.api_key, check_google_key, force=request.force)
+
+async def execute_script_request(request: ScriptRequest, max_tokens: int = DEFAULT_MAX_TOKENS) -> Tuple[int, dict]:
+    # Shared by the single, batch and scene endpoints: returns (HTTP status, response payload) and never raises
+    # for provider or request errors.
+    if request.routing is not None:
+        return await execute_routed_request(request, max_tokens)
     try:
-        genai.configure(api_key=request.api_key)
-        # Attempt a lightweight, quick call to validate the key
-        # Listing models is a good, low-cost way to check authentication and basic API access.
-        # If this doesn't work well, a tiny generation call could be an alternative.
-        models = genai.list_models() # This is a synchronous call, wrap if needed for async or use async equivalent
-        # Check if we got a list of models (even if empty, it means auth worked)
-        # A more robust check might be to see if a specific expected model type is in the list
-        # For now, just checking if the call itself succeeded without an auth error is enough.
-        # Example: iterate and print (for server log, not for response)
-        # for m in models:
-        #     if 'generateContent' in m.supported_generation_methods:
-        #         print(m.name)
-        if models is not None: # Check if the call returned something (not None)
-             return {"success": True, "message": "Google API Key appears valid (successfully listed models)."}
-        else:
-            # This case might not be hit if list_models() errors out first on bad key
-            return {"success": False, "error": "Google API Key validation failed (could not list models)."}
-
-    except google.api_core.exceptions.PermissionDenied as e:
-        print(f"Google API Permission Denied during validation: {e}")
-        return {"success": False, "error": "Invalid Google API Key (Permission Denied)."}
-    except google.api_core.exceptions.Unauthenticated as e: # More specific for bad keys
-        print(f"Google API Unauthenticated during validation: {e}")
-        return {"success": False, "error": "Invalid Google API Key (Unauthenticated)."}
-    except google.api_core.exceptions.GoogleAPIError as e:
-        print(f"Google API Error during validation: {e}")
-        return {"success": False, "error": f"Google API error during validation: {e}."}
+        target = await resolve_generation_target(request)
+    except GenerationRequestError as e:
+        return e.status_code, e.payload
+    metrics.set_request_target(target.provider.name, target.model_id) # Labels the route's end-to-end latency
+
+    cache_key = generation_cache_key(request, target, max_tokens)
+    cached = await cached_generation(request, cache_key)
+    if cached is not None:
+        logger.info(f"Generation cache hit for model {target.model_id}")
+        return 200, {"success": True, "data": {"script": cached["script"], "cached": True, "stop_reason": cached.get("stop_reason")}}
+
+    try:
+        result = await run_generation(target, request.prompt, max_tokens, priority=request.priority)
+    except ProviderError as e:
+        logger.error(f"{target.provider.display_name} {e.error_type} for model {target.model_id}: status_code={e.status_code} {e.message}")
+        return provider_error_payload(e)
+    # General fallback for other UNEXPECTED errors during script generation
     except Exception as e:
-        print(f"Unexpected Google key validation error: {e}")
-        return {"success": False, "error": "Key validation failed due to an unexpected API error."}
+        logger.exception(f"Unexpected unhandled exception during script generation with model {target.model_id}:")
+        return unexpected_error_payload(e, target.model_id)
+
+    if not result.text:
+        logger.warning(f"No text content extracted from {target.provider.display_name} LLM response for model {target.model_id} (stop_reason={result.stop_reason}).")
+        return 200, {"success": True, "data": {"script": f"[No text content found in {target.provider.display_name} response]", "empty": True}}
+
+    await store_generation(cache_key, result)
+    return 200, {"success": True, "data": {"script": result.text, "cached": False, "stop_reason": result.stop_reason}}
+
+# --- Multi-model routing ---
+# With a "routing" policy, /generate-script tries equivalent models in health-adjusted order, failing over on
+# retryable errors (429, 5xx, timeouts) and optionally hedging a slow call with the next model.
+
+async def routing_candidates(request: ScriptRequest) -> Tuple[List[GenerationTarget], Optional[GenerationRequestError]]:
+    # Resolves every listed model; ones that can't be used (unknown model, no key, known-bad key) are skipped.
+    try:
+        primary = await load_provider_for_model(request.model_identifier)
+    except ProviderError:
+        primary = None # Reported (and skipped) with the other candidates below
+    targets, first_error, seen = [], None, set()
+    for model_id in [request.model_identifier] + list(request.routing.models):
+        if model_id in seen:
+            continue
+        seen.add(model_id)
+        try:
+            provider = await load_provider_for_model(model_id)
+            same_provider = provider is not None and primary is not None and provider.name == primary.name
+            api_key = (request.api_key if same_provider else None) or request.routing.api_keys.get(provider.name if provider else "")
+            targets.append(await resolve_generation_target(request.model_copy(update={"model_identifier": model_id, "api_key": api_key})))
+        except GenerationRequestError as e:
+            logger.info(f"Routing: skipping model {model_id}: {e.payload.get('error')}")
+            first_error = first_error or e
+        except ProviderError as e:
+            logger.info(f"Routing: skipping model {model_id}: {e.message}")
+            first_error = first_error or GenerationRequestError(*provider_error_payload(e))
+    return targets, first_error
+
+def describe_route(targets: List[GenerationTarget], attempts, winner: Optional[int], hedge_after: Optional[float]) -> dict:
+    for attempt in attempts:
+        target = targets[attempt.index]
+        metrics.ROUTING_ATTEMPTS.inc(provider=target.provider.name, model=target.model_id, outcome=attempt.outcome, hedge=str(attempt.hedge).lower())
+    return {
+        "model": targets[winner].model_id if winner is not None else None,
+        "provider": targets[winner].provider.name if winner is not None else None,
+        "hedge_after_ms": round(hedge_after * 1000, 1) if hedge_after is not None else None,
+        "attempts": [{
+            "model": targets[a.index].model_id,
+            "hedge": a.hedge,
+            "outcome": a.outcome,
+            "elapsed_ms": round(a.elapsed * 1000, 1) if a.elapsed is not None else None,
+            "error": f"{getattr(a.error, 'error_type', None) or type(a.error).__name__}: {getattr(a.error, 'message', a.error)}" if a.error else None,
+        } for a in attempts],
+    }
+
+async def execute_routed_request(request: ScriptRequest, max_tokens: int) -> Tuple[int, dict]:
+    policy = request.routing
+    targets, resolve_error = await routing_candidates(request)
+    if not targets:
+        return resolve_error.status_code, resolve_error.payload
+    order = provider_health.order([(t.provider.name, t.model_id) for t in targets], policy.strategy)
+    targets = [targets[i] for i in order][:max(1, policy.max_attempts or len(targets))]
+
+    cache_keys = [generation_cache_key(request, target, max_tokens) for target in targets]
+    for target, cache_key in zip(targets, cache_keys):
+        cached = await cached_generation(request, cache_key)
+        if cached is not None:
+            logger.info(f"Generation cache hit for routed model {target.model_id}")
+            metrics.set_request_target(target.provider.name, target.model_id)
+            return 200, {"success": True, "data": {"script": cached["script"], "cached": True, "stop_reason": cached.get("stop_reason"),
+                                                   "routing": {"model": target.model_id, "provider": target.provider.name, "attempts": []}}}
+
+    hedge_after = None
+    if policy.hedge and len(targets) > 1:
+        if policy.hedge_after_ms is not None:
+            hedge_after = policy.hedge_after_ms / 1000
+        else:
+            hedge_after = max(ROUTING_MIN_HEDGE_SECONDS, provider_health.hedge_delay(targets[0].provider.name, targets[0].model_id, ROUTING_DEFAULT_HEDGE_SECONDS))
+
+    async def attempt(index: int) -> GenerationResult:
+        # Scheduler retries (with backoff) only on the last candidate; before that, failing over is faster.
+        last = index == len(targets) - 1
+        return await run_generation(targets[index], request.prompt, max_tokens, request.priority, max_retries=None if last else 0)
+
+    try:
+        route = await router.run(len(targets), attempt, hedge_after)
+    except RouteError as e:
+        routing_info = describe_route(targets, e.attempts, None, hedge_after)
+        if isinstance(e.error, ProviderError):
+            logger.error(f"Routing failed after {len(e.attempts)} attempt(s): {e.error.error_type} {e.error.message}")
+            status_code, payload = provider_error_payload(e.error)
+        else:
+            logger.error(f"Routing failed after {len(e.attempts)} attempt(s) with an unexpected error: {e.error!r}")
+            status_code, payload = unexpected_error_payload(e.error, targets[e.attempts[-1].index].model_id)
+        payload["data"]["routing"] = routing_info
+        return status_code, payload
+
+    target, result = targets[route.index], route.value
+    metrics.set_request_target(target.provider.name, target.model_id) # The winner
+    routing_info = describe_route(targets, route.attempts, route.index, hedge_after)
+    if not result.text:
+        logger.warning(f"No text content extracted from {target.provider.display_name} LLM response for model {target.model_id} (stop_reason={result.stop_reason}).")
+        return 200, {"success": True, "data": {"script": f"[No text content found in {target.provider.display_name} response]", "empty": True, "routing": routing_info}}
+    await store_generation(cache_keys[route.index], result)
+    return 200, {"success": True, "data": {"script": result.text, "cached": False, "stop_reason": result.stop_reason, "routing": routing_info}}
 
 @app.post("/generate-script")
 async def generate_script_endpoint(request: ScriptRequest):
-    model_id = request.model_identifier
-    prompt_text = request.prompt
-    api_key_from_request = request.api_key
-    custom_system_prompt = request.system_prompt # Get custom system prompt
+    status_code, payload = await execute_script_request(request)
+    if status_code != 200:
+        return JSONResponse(status_code=status_code, content=payload)
+    return payload
+
+# --- Streaming variant of /generate-script ---
+# Sends text deltas as they arrive from the provider, then a terminal "done" event with the
+# assembled script, stop reason and timing (time to first token + total time).
+# Supported wire formats: "sse" (text/event-stream, default) and "ndjson" (one JSON object per line).
+
+STREAM_MEDIA_TYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+def format_stream_event(event_type: str, payload: dict, stream_format: str) -> str:
+    if stream_format == "ndjson":
+        return json.dumps({"type": event_type, **payload}) + "\n"
+    return f"event: {event_type}\ndata: {json.dumps(payload)}\n\n"
 
+def describe_stream_error(e: Exception) -> dict:
+    # Same status codes and payload shape that generate_script_endpoint returns for the same failures.
+    if isinstance(e, ProviderError):
+        status_code, payload = provider_error_payload(e)
+    else:
+        status_code, payload = 500, {"success": False, "error": f"LLM Server error ({type(e).__name__}): {e}", "data": {"raw_error": str(e), "error_type": type(e).__name__}}
+    return {"status_code": status_code, **payload}
+
+@app.post("/generate-script/stream")
+async def generate_script_stream_endpoint(request: ScriptRequest, http_request: Request, format: str = "sse"):
+    if format not in STREAM_MEDIA_TYPES:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"Unknown stream format '{format}'. Use 'sse' or 'ndjson'."})
+
+    # Key/model problems are reported as a normal JSON response, before the stream is opened.
     try:
-        if model_id.startswith("claude-"):
-            # ANTHROPIC API CALL
-            key_to_use = api_key_from_request
-            if not key_to_use:
-                print("Anthropic API key not provided in request, attempting to use ANTHROPIC_API_KEY from environment.")
-                key_to_use = os.environ.get("ANTHROPIC_API_KEY")
-            
-            if not key_to_use:
-                return {"success": False, "error": "Anthropic API key not found in request or ANTHROPIC_API_KEY environment variable."}
-
-            client = anthropic.Anthropic(api_key=key_to_use)
-            
-            # Use custom system prompt if provided, else default
-            system_message_to_use = custom_system_prompt if custom_system_prompt else SYSTEM_MESSAGE_SCRIPTING_ANTHROPIC
-            logger.info(f"Using system prompt for Anthropic: {system_message_to_use[:100]}...") # Log first 100 chars
-
-            response = client.messages.create(
-                model=model_id, 
-                max_tokens=2048,
-                system=system_message_to_use, # Use determined system message
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt_text
-                    }
-                ]
-            )
-            
-            script_text = ""
-            if response.content and isinstance(response.content, list):
-                for block in response.content:
-                    if hasattr(block, 'text'):
-                        script_text += block.text
-            
-            if not script_text:
-                print("Warning: No text content extracted from Anthropic LLM response. Full response:", response)
-                return {"success": True, "data": {"script": "[No text content found in Anthropic response]"}}
-
-            return {"success": True, "data": {"script": script_text}}
-
-        elif model_id.startswith("gemini-"):
-            # GOOGLE GEMINI API CALL
-            key_to_use = api_key_from_request
-            if not key_to_use:
-                print("Google API key not provided in request, attempting to use GOOGLE_API_KEY from environment.")
-                key_to_use = os.environ.get("GOOGLE_API_KEY")
-
-            if not key_to_use:
-                return {"success": False, "error": "Google API key not found in request or GOOGLE_API_KEY environment variable."}
-
-            try: # Start of new try block for Gemini specific calls
-                genai.configure(api_key=key_to_use)
-                
-                generation_config = genai.types.GenerationConfig(
-                    max_output_tokens=2048,
-                )
-                
-                # Use custom system prompt if provided, else default for Gemini
-                system_message_to_use_gemini = custom_system_prompt if custom_system_prompt else SYSTEM_MESSAGE_SCRIPTING_GEMINI
-                logger.info(f"Using system prompt for Gemini: {system_message_to_use_gemini[:100]}...") # Log first 100 chars
-
-                model = genai.GenerativeModel(
-                    model_name=model_id,
-                    system_instruction=system_message_to_use_gemini, # Use determined system message
-                    generation_config=generation_config
-                )
-                
-                logger.info(f"Attempting to generate content with Gemini model: {model_id}")
-                response = await model.generate_content_async(prompt_text) # Using async version
-                logger.info(f"Received response from Gemini model: {model_id}")
-
-                script_text = ""
-                if response.candidates and len(response.candidates) > 0:
-                    candidate = response.candidates[0]
-                    if candidate.content and candidate.content.parts:
-                        for part in candidate.content.parts:
-                            if hasattr(part, 'text'):
-                                script_text += part.text
-                
-                if not script_text:
-                    logger.warning(f"No text content extracted from Gemini LLM response for model {model_id}. Full response: {response}")
-                    if response.prompt_feedback and response.prompt_feedback.block_reason:
-                        block_reason_message = response.prompt_feedback.block_reason_message or "Content blocked"
-                        logger.error(f"Gemini content generation blocked for model {model_id}: {block_reason_message}")
-                        return JSONResponse(
-                            status_code=400, # Or a more appropriate error code for blocked content
-                            content={"success": False, "error": f"Gemini content generation blocked: {block_reason_message}"}
-                        )
-                    return {"success": True, "data": {"script": "[No text content extracted from Gemini response]"}}
-
-                return {"success": True, "data": {"script": script_text}}
-
-            except Exception as gemini_e: # Catch specific Gemini errors
-                logger.exception(f"Error during Gemini API call for model {model_id}:")
-                # Try to get more specific error details if it's a Google API core exception
-                error_detail = str(gemini_e)
-                error_type = type(gemini_e).__name__
-                # if isinstance(gemini_e, google.api_core.exceptions.GoogleAPIError):
-                #     # This can provide more structured error information
-                #     error_detail = f"Reason: {gemini_e.reason}, Message: {gemini_e.message}" # Example fields
-
-                return JSONResponse(
-                    status_code=500,
-                    content={"success": False, "error": f"LLM Server error (Gemini - {error_type}): {error_detail}", "data": {"raw_error": str(gemini_e), "error_type": error_type}}
-                )
-        
-        else:
-            print(f"Model identifier '{request.model_identifier}' not recognized for specific handling.")
-            # Basic placeholder - replace with actual logic or error if model is unknown
-            # For now, let's assume a generic error if not Claude or Gemini
-            return JSONResponse(
-                status_code=400,
-                content={"success": False, "error": f"Model '{request.model_identifier}' not supported by this endpoint yet."}
-            )
-
-    except anthropic.APIConnectionError as e:
-        print(f"Anthropic APIConnectionError: {e}")
-        error_message = f"Anthropic server could not be reached: {e.__cause__}"
-        return JSONResponse(status_code=503, content={"success": False, "error": error_message, "data": {"raw_error": str(e)}})
-    except anthropic.RateLimitError as e:
-        print(f"Anthropic RateLimitError: {e}")
-        error_message = "Anthropic API rate limit exceeded."
-        return JSONResponse(status_code=429, content={"success": False, "error": error_message, "data": {"raw_error": str(e)}})
-    except anthropic.APIStatusError as e:
-        print(f"Anthropic APIStatusError status_code={e.status_code} response={e.response}")
-        logger.error(f"Anthropic APIStatusError for model {request.model_identifier}: status_code={e.status_code}", exc_info=True)
-        error_body = "Unknown error structure"
+        target = await resolve_generation_target(request)
+    except GenerationRequestError as e:
+        return e.response()
+    metrics.set_request_target(target.provider.name, target.model_id)
+    cache_key = generation_cache_key(request, target, DEFAULT_MAX_TOKENS)
+    deltas = stream_generation(target, request.prompt, priority=request.priority)
+
+    async def event_stream():
+        started_at = time.perf_counter()
+        first_token_at = None
+        script_parts = []
+        result = None
         try:
-            error_body = e.response.json() # Attempt to parse error
-        except json.JSONDecodeError:
-            error_body = e.response.text # Fallback to raw text
-        error_message = f"Anthropic API error (Status {e.status_code})"
-        return JSONResponse(status_code=e.status_code, content={"success": False, "error": error_message, "data": {"raw_error": error_body}})
-    
-    # General fallback for other UNEXPECTED errors during script generation
-    # This should ideally not be hit if specific exceptions for Anthropic and Gemini are comprehensive.
-    except Exception as e: 
-        logger.exception(f"Unexpected unhandled exception during script generation with model {request.model_identifier}:")
-        
-        # Determine if it was likely an Anthropic or Gemini context if not caught above, though this is less ideal
-        api_context = "Unknown API"
-        if "gemini" in request.model_identifier:
-            api_context = "Gemini"
-        elif "claude" in request.model_identifier:
-            api_context = "Anthropic"
-
-        error_message = f"Unexpected LLM Server error ({api_context}): {type(e).__name__} - {str(e)}"
-        return JSONResponse(
-            status_code=500, 
-            content={"success": False, "error": error_message, "data": {"raw_error": str(e), "error_type": type(e).__name__}}
-        )
+            cached = await cached_generation(request, cache_key)
+            if cached is not None:
+                # Replay the cached script as a single delta so clients don't need a separate code path.
+                logger.info(f"Generation cache hit for streamed model {target.model_id}")
+                yield format_stream_event("delta", {"text": cached["script"]}, format)
+                yield format_stream_event("done", {
+                    "success": True,
+                    "data": {
+                        "script": cached["script"],
+                        "stop_reason": cached.get("stop_reason"),
+                        "cached": True,
+                        "timing": {
+                            "time_to_first_token_ms": round((time.perf_counter() - started_at) * 1000, 1),
+                            "total_ms": round((time.perf_counter() - started_at) * 1000, 1),
+                        },
+                    },
+                }, format)
+                return
+
+            async for item in deltas:
+                if isinstance(item, GenerationResult):
+                    result = item
+                    continue
+                if await http_request.is_disconnected():
+                    logger.info(f"Client disconnected, cancelling stream for model {target.model_id}")
+                    return
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                script_parts.append(item)
+                yield format_stream_event("delta", {"text": item}, format)
+
+            finished_at = time.perf_counter()
+            if result is not None:
+                await store_generation(cache_key, result)
+            yield format_stream_event("done", {
+                "success": True,
+                "data": {
+                    "script": "".join(script_parts),
+                    "stop_reason": result.stop_reason if result else None,
+                    "cached": False,
+                    "timing": {
+                        "time_to_first_token_ms": round((first_token_at - started_at) * 1000, 1) if first_token_at else None,
+                        "total_ms": round((finished_at - started_at) * 1000, 1),
+                    },
+                },
+            }, format)
+        except Exception as e:
+            if isinstance(e, ProviderError):
+                logger.error(f"{target.provider.display_name} {e.error_type} while streaming model {target.model_id}: {e.message}")
+            else:
+                logger.exception(f"Error while streaming from model {target.model_id}:")
+            yield format_stream_event("error", describe_stream_error(e), format)
+        finally:
+            # Closing the generator closes the upstream HTTP stream, so we stop paying for tokens nobody reads.
+            # Shielded because on disconnect this runs inside an already-cancelled scope.
+            with anyio.CancelScope(shield=True):
+                await deltas.aclose()
+
+    return StreamingResponse(event_stream(), media_type=STREAM_MEDIA_TYPES[format], headers={"Cache-Control": "no-cache"})
+
+# --- Batch generation ---
+# Runs N jobs concurrently (bounded) and streams each result as soon as it finishes, in completion order,
+# tagged with its job index. A failed job produces a failed "result" event; the rest of the batch carries on.
+
+def batch_job_request(request: BatchScriptRequest, job: BatchJob) -> ScriptRequest:
+    prompt = job.prompt if job.prompt is not None else request.prompt
+    model_identifier = job.model_identifier or request.model_identifier
+    if not prompt or not model_identifier:
+        raise GenerationRequestError(400, {"success": False, "error": "Batch job needs a prompt and a model_identifier (directly or from the batch defaults)."})
+    return ScriptRequest(
+        prompt=prompt,
+        model_identifier=model_identifier,
+        api_key=job.api_key or request.api_key,
+        system_prompt=job.system_prompt or request.system_prompt,
+        cache=request.cache,
+        priority=request.priority,
+    )
+
+@app.post("/generate-script/batch")
+async def generate_script_batch_endpoint(request: BatchScriptRequest, format: str = "sse"):
+    if format not in STREAM_MEDIA_TYPES:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"Unknown stream format '{format}'. Use 'sse' or 'ndjson'."})
+    if not request.jobs:
+        return JSONResponse(status_code=400, content={"success": False, "error": "Batch contains no jobs."})
+    if len(request.jobs) > BATCH_MAX_JOBS:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"Batch has {len(request.jobs)} jobs; the limit is {BATCH_MAX_JOBS}."})
+
+    # Provider-level limits still apply through the scheduler; this only bounds the fan-out of this batch.
+    concurrency = max(1, min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY, len(request.jobs)))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_job(index: int, job: BatchJob):
+        async with semaphore:
+            started_at = time.perf_counter()
+            try:
+                status_code, payload = await execute_script_request(batch_job_request(request, job))
+            except GenerationRequestError as e:
+                status_code, payload = e.status_code, e.payload
+            return index, status_code, payload, round((time.perf_counter() - started_at) * 1000, 1)
+
+    async def event_stream():
+        started_at = time.perf_counter()
+        tasks = [asyncio.create_task(run_job(index, job)) for index, job in enumerate(request.jobs)]
+        succeeded = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, status_code, payload, elapsed_ms = await next_done
+                if payload.get("success"):
+                    succeeded += 1
+                yield format_stream_event("result", {"index": index, "status_code": status_code, "elapsed_ms": elapsed_ms, **payload}, format)
+
+            yield format_stream_event("done", {
+                "success": True,
+                "data": {
+                    "total": len(tasks),
+                    "succeeded": succeeded,
+                    "failed": len(tasks) - succeeded,
+                    "concurrency": concurrency,
+                    "total_ms": round((time.perf_counter() - started_at) * 1000, 1),
+                },
+            }, format)
+        finally:
+            # If the client went away, stop the jobs that haven't finished yet.
+            for task in tasks:
+                task.cancel()
+            with anyio.CancelScope(shield=True):
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    return StreamingResponse(event_stream(), media_type=STREAM_MEDIA_TYPES[format], headers={"Cache-Control": "no-cache"})
+
+# --- Scene-level editing ---
+# /script/parse turns a Markdown screenplay into indexed scenes and characters. /script/scene rewrites or
+# extends one scene: the prompt carries only that scene plus one-line summaries of its neighbours, and
+# max_tokens is sized from the scene, so cost and latency follow the edit rather than the whole script.
+
+def scene_max_tokens(request: SceneEditRequest, scene_text: str) -> int:
+    if request.max_tokens:
+        return max(1, min(request.max_tokens, SCENE_MAX_TOKENS))
+    scene_tokens = estimate_tokens(scene_text)
+    # A rewrite gets room to grow the scene to roughly twice its length; an extension about one more scene's worth.
+    budget = scene_tokens * 2 + 256 if request.mode == "rewrite" else scene_tokens + 512
+    return max(512, min(budget, SCENE_MAX_TOKENS))
+
+@app.post("/script/parse")
+async def parse_script_endpoint(request: ScriptParseRequest, include_text: bool = False):
+    document = parse_script(request.script)
+    return {"success": True, "data": document.to_dict(include_text=include_text)}
+
+@app.post("/script/scene")
+async def edit_scene_endpoint(request: SceneEditRequest):
+    document = parse_script(request.script)
+    if not document.scenes:
+        return JSONResponse(status_code=400, content={"success": False, "error": "No scenes found. Scene headings must start with INT. or EXT. (e.g. '## INT. COFFEE SHOP - DAY')."})
+    if not 0 <= request.scene_index < len(document.scenes):
+        return JSONResponse(status_code=400, content={"success": False, "error": f"scene_index {request.scene_index} is out of range (script has {len(document.scenes)} scenes)."})
+
+    scene = document.scenes[request.scene_index]
+    max_tokens = scene_max_tokens(request, scene.text)
+    scene_request = ScriptRequest(
+        prompt=build_scene_prompt(document, request.scene_index, request.instruction, request.mode, max(0, request.context_scenes)),
+        model_identifier=request.model_identifier,
+        api_key=request.api_key,
+        system_prompt=request.system_prompt or SYSTEM_MESSAGE_SCENE_EDITING,
+        cache=request.cache,
+        priority=request.priority,
+    )
+    logger.info(f"Scene {request.mode} for scene {request.scene_index} of {len(document.scenes)}: prompt {len(scene_request.prompt)} chars (script {len(request.script)}), max_tokens={max_tokens}")
+
+    status_code, payload = await execute_script_request(scene_request, max_tokens)
+    if status_code != 200:
+        return JSONResponse(status_code=status_code, content=payload)
+    if payload["data"].get("empty"):
+        return JSONResponse(status_code=502, content={"success": False, "error": "The model returned no text for the scene; the script was left unchanged."})
+
+    new_scene_text, dropped_scenes = splice_scene(document, request.scene_index, payload["data"]["script"], request.mode)
+    if request.mode == "extend" and new_scene_text == scene.text:
+        return JSONResponse(status_code=502, content={"success": False, "error": "The model returned no new text for the scene; the script was left unchanged."})
+    if dropped_scenes:
+        logger.warning(f"Scene {request.mode}: dropped {dropped_scenes} extra scene(s) from the model output for scene {request.scene_index}")
+    updated = document.with_scene_text(request.scene_index, new_scene_text)
+    stop_reason = payload["data"].get("stop_reason")
+    return {"success": True, "data": {
+        "scene_index": request.scene_index,
+        "mode": request.mode,
+        "scene": new_scene_text,
+        "script": updated.to_markdown(),
+        "document": updated.to_dict(),
+        "cached": payload["data"].get("cached", False),
+        "stop_reason": stop_reason,
+        "truncated": stop_reason in ("max_tokens", "MAX_TOKENS"),
+        "max_tokens": max_tokens,
+        "dropped_scenes": dropped_scenes, # Extra scenes the model wrote that were not spliced in
+    }}
+
+# --- Background jobs ---
+# POST /jobs queues a generation and returns its id immediately; the work runs on the server whether or not
+# the client stays connected. Poll GET /jobs/{id} (pass ?offset= to fetch only new output) or subscribe to
+# GET /jobs/{id}/events. Jobs and their results are kept in SQLite for JOBS_RETENTION_SECONDS.
+
+def job_secrets(request: ScriptRequest) -> Optional[dict]:
+    # Every key a job needs, kept in memory by the queue; None means it can run on env-var keys alone.
+    secrets = {}
+    if request.api_key:
+        secrets["api_key"] = request.api_key
+    if request.routing is not None and request.routing.api_keys:
+        secrets["routing_api_keys"] = dict(request.routing.api_keys)
+    return secrets or None
+
+async def run_script_job(params: dict, secrets: Optional[dict], on_delta) -> Tuple[int, dict]:
+    # Streams the generation so partial output is visible (and persisted) while the job runs.
+    secrets = secrets or {}
+    if params.get("routing") is not None:
+        params = {**params, "routing": {**params["routing"], "api_keys": secrets.get("routing_api_keys", {})}}
+    request = ScriptRequest(**params, api_key=secrets.get("api_key"))
+    if request.routing is not None:
+        # Failover and hedging pick a winner only once an attempt completes, so routed jobs publish their
+        # output in one piece.
+        status_code, payload = await execute_script_request(request)
+        if payload.get("success") and not payload["data"].get("empty"):
+            on_delta(payload["data"]["script"])
+        return status_code, payload
+    try:
+        target = await resolve_generation_target(request)
+    except GenerationRequestError as e:
+        return e.status_code, e.payload
+    cache_key = generation_cache_key(request, target, DEFAULT_MAX_TOKENS)
+    cached = await cached_generation(request, cache_key)
+    if cached is not None:
+        logger.info(f"Generation cache hit for job with model {target.model_id}")
+        on_delta(cached["script"])
+        return 200, {"success": True, "data": {"script": cached["script"], "cached": True, "stop_reason": cached.get("stop_reason")}}
+
+    deltas = stream_generation(target, request.prompt, priority=request.priority)
+    script_parts = []
+    result = None
+    try:
+        async for item in deltas:
+            if isinstance(item, GenerationResult):
+                result = item
+                continue
+            script_parts.append(item)
+            on_delta(item)
+    except ProviderError as e:
+        logger.error(f"{target.provider.display_name} {e.error_type} in job for model {target.model_id}: {e.message}")
+        return provider_error_payload(e)
+    except Exception as e:
+        logger.exception(f"Unexpected exception in job for model {target.model_id}:")
+        return unexpected_error_payload(e, target.model_id)
+    finally:
+        with anyio.CancelScope(shield=True):
+            await deltas.aclose()
+
+    if result is not None:
+        await store_generation(cache_key, result)
+    return 200, {"success": True, "data": {"script": "".join(script_parts), "cached": False, "stop_reason": result.stop_reason if result else None}}
+
+job_queue = JobQueue(
+    os.path.join(DATA_DIR, "jobs.sqlite3"),
+    run_script_job,
+    max_workers=int(os.environ.get("JOBS_MAX_WORKERS", "2")),
+    retention_seconds=float(os.environ.get("JOBS_RETENTION_SECONDS", str(7 * 24 * 3600))),
+    max_queued=int(os.environ.get("JOBS_MAX_QUEUED", "1000")),
+)
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest):
+    # Model and key problems are reported now rather than as a failed job later.
+    if request.routing is not None:
+        targets, resolve_error = await routing_candidates(request)
+        if not targets:
+            return resolve_error.response()
+    else:
+        try:
+            await resolve_generation_target(request)
+        except GenerationRequestError as e:
+            return e.response()
+    params = request.model_dump(exclude={"api_key": True, "routing": {"api_keys"}}) # Keys stay in memory only
+    try:
+        job = await job_queue.submit("script", params, job_secrets(request), PRIORITIES[request.priority])
+    except JobQueueFullError as e:
+        return JSONResponse(status_code=429, content={"success": False, "error": str(e)})
+    return {"success": True, "data": job}
+
+@app.get("/jobs")
+async def list_jobs(status: Optional[str] = None, limit: int = 50):
+    return {"success": True, "data": await job_queue.list(status, limit)}
+
+@app.get("/jobs/stats")
+async def job_stats():
+    return {"success": True, "data": await job_queue.stats()}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, offset: int = 0):
+    job = await job_queue.get(job_id, offset)
+    if job is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": f"Job {job_id} not found."})
+    return {"success": True, "data": job}
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, format: str = "sse"):
+    # "status" -> "delta"* -> "done"; output produced before subscribing is sent first, so reconnecting is safe.
+    if format not in STREAM_MEDIA_TYPES:
+        return JSONResponse(status_code=400, content={"success": False, "error": f"Unknown stream format '{format}'. Use 'sse' or 'ndjson'."})
+    if await job_queue.get(job_id) is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": f"Job {job_id} not found."})
+
+    async def event_stream():
+        async for event_type, payload in job_queue.subscribe(job_id):
+            if event_type == "done":
+                payload = {"success": payload["status"] == "succeeded", "data": payload}
+            yield format_stream_event(event_type, payload, format)
+
+    return StreamingResponse(event_stream(), media_type=STREAM_MEDIA_TYPES[format], headers={"Cache-Control": "no-cache"})
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": f"Job {job_id} not found."})
+    return {"success": True, "data": job}
+
+@app.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    if not await job_queue.delete(job_id):
+        return JSONResponse(status_code=409, content={"success": False, "error": f"Job {job_id} not found or still active; cancel it first."})
+    return {"success": True, "message": f"Job {job_id} deleted."}
+
+def collect_component_metrics():
+    # Scrape-time view of the scheduler queues, client pool and caches.
+    queue_depth = metrics.Gauge("scheduler_queue_depth", "Requests waiting for admission, by priority.", ("provider", "priority"))
+    active = metrics.Gauge("scheduler_active_requests", "Requests admitted and running, per provider.", ("provider",))
+    oldest_wait = metrics.Gauge("scheduler_oldest_wait_seconds", "Age of the oldest queued request.", ("provider",))
+    retries = metrics.Counter("scheduler_retries_total", "Provider calls retried after a retryable failure.", ("provider",))
+    for provider_name, stats in scheduler.stats().items():
+        for priority in PRIORITIES:
+            queue_depth.set(stats["queued_by_priority"][priority], provider=provider_name, priority=priority)
+        active.set(stats["active"], provider=provider_name)
+        oldest_wait.set(stats["oldest_wait_seconds"], provider=provider_name)
+        retries.inc(stats["retries"], provider=provider_name)
+    pooled_clients = metrics.Gauge("provider_client_pool_size", "Async provider clients currently pooled.")
+    pooled_clients.set(len(client_pool))
+    collected = [queue_depth, active, oldest_wait, retries, pooled_clients]
+
+    active_jobs = metrics.Gauge("jobs_active", "Background jobs queued or running.", ("status",))
+    for status, count in job_queue.active_counts().items():
+        active_jobs.set(count, status=status)
+    finished_jobs = metrics.Counter("jobs_finished_total", "Background jobs finished since startup, by outcome.", ("status",))
+    for status, count in job_queue.completed.items():
+        finished_jobs.inc(count, status=status)
+    collected.extend([active_jobs, finished_jobs])
+
+    health_latency = metrics.Gauge("provider_health_latency_seconds", "Smoothed (EWMA) latency of successful provider calls, as used for routing.", ("provider", "model"))
+    health_errors = metrics.Gauge("provider_health_error_rate", "Smoothed (EWMA) rate of retryable provider failures, as used for routing.", ("provider", "model"))
+    for provider_name, provider_stats in provider_health.stats().items():
+        for model_id, model_stats in provider_stats["models"].items():
+            if model_stats["latency_ms"] is not None:
+                health_latency.set(model_stats["latency_ms"] / 1000, provider=provider_name, model=model_id)
+            health_errors.set(model_stats["error_rate"], provider=provider_name, model=model_id)
+    collected.extend([health_latency, health_errors])
+
+    key_stats = key_validator.stats()
+    key_lookups = metrics.Counter("key_validation_lookups_total", "API key validation lookups, by result.", ("result",))
+    for result in ("hits", "misses", "shared"):
+        key_lookups.inc(key_stats[result], result=result)
+    collected.append(key_lookups)
+
+    if generation_cache is not None:
+        cache_lookups = metrics.Counter("generation_cache_lookups_total", "Generation cache lookups, by result.", ("result",))
+        cache_lookups.inc(generation_cache.hits, result="hit")
+        cache_lookups.inc(generation_cache.misses, result="miss")
+        cache_evictions = metrics.Counter("generation_cache_evictions_total", "Generation cache entries evicted by the size cap.")
+        cache_evictions.inc(generation_cache.evictions)
+        collected.extend([cache_lookups, cache_evictions])
+    return collected
+
+metrics.registry.add_collector(collect_component_metrics)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    return {"success": True, "data": scheduler.stats()}
+
+@app.get("/routing/stats")
+async def routing_stats():
+    return {"success": True, "data": provider_health.stats()}
+
+@app.get("/cache/stats")
+async def generation_cache_stats():
+    if generation_cache is None:
+        return {"success": False, "error": "Generation cache is disabled (GENERATION_CACHE_ENABLED=0)."}
+    return {"success": True, "data": await generation_cache.stats()}
+
+@app.delete("/cache")
+async def clear_generation_cache():
+    if generation_cache is None:
+        return {"success": False, "error": "Generation cache is disabled (GENERATION_CACHE_ENABLED=0)."}
+    await generation_cache.clear()
+    return {"success": True, "message": "Generation cache cleared."}
 
 # To run this (from your project's root directory, in a separate terminal):
 # 1. Ensure you have fastapi and uvicorn installed: 
-#    pip install fastapi "uvicorn[standard]" anthropic
-# 2. Set ANTHROPIC_API_KEY environment variable: 
+#    pip install fastapi "uvicorn[standard]" anthropic httpx
+# 2. Set ANTHROPIC_API_KEY (and/or GOOGLE_API_KEY) environment variable: 
 #    (Windows PowerShell) $env:ANTHROPIC_API_KEY="your_actual_api_key_here"
 #    (bash/zsh) export ANTHROPIC_API_KEY="your_actual_api_key_here"
 # 3. Navigate to the python_server directory: 
 #    cd python_server
 # 4. Run the server: 
-#    uvicorn main:app --reload --port 8000 
\ No newline at end of file
+#    uvicorn main:app --reload --port 8000 
+#
+# Offline benchmarking against fake providers (no API keys or network needed): see bench/load_test.py
+# Startup time (spawn -> first /ping, as the Electron app sees it): see bench/cold_start.py
@@ -0,0 +1,300 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import bisect
+import time
+
+# Minimal Prometheus text-format metrics, so the backend doesn't need prometheus_client.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in sorted(self._values.items())
+        ]
+
+
+INF_LABEL = 'le="+Inf"'
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {} # key -> [per-bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le_label = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le_label)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, INF_LABEL)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[_Metric]]):
+        # Collectors build metrics from other components' stats at scrape time (scheduler queues, caches).
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP requests handled, by route and status.", ("method", "route", "status"))
+HTTP_LATENCY = registry.histogram("http_request_duration_seconds", "End-to-end HTTP request latency, including streamed bodies.", ("method", "route"))
+HTTP_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being handled.")
+PROVIDER_REQUESTS = registry.counter("provider_requests_total", "Provider API calls, by outcome.", ("provider", "model", "operation", "outcome"))
+PROVIDER_LATENCY = registry.histogram("provider_request_duration_seconds", "Upstream provider call latency (excludes queueing).", ("provider", "model", "operation"))
+PROVIDER_TTFT = registry.histogram("provider_time_to_first_token_seconds", "Time from starting a streamed provider call to its first text delta.", ("provider", "model"))
+PROVIDER_IN_FLIGHT = registry.gauge("provider_requests_in_flight", "Provider API calls currently open.", ("provider", "model"))
+PROVIDER_TOKENS = registry.counter("provider_tokens_total", "Tokens reported by provider usage fields.", ("provider", "model", "direction"))
+PROVIDER_TOKENS_PER_CALL = registry.histogram("provider_output_tokens_per_call", "Output tokens per provider call.", ("provider", "model"), buckets=TOKEN_BUCKETS)
+PROVIDER_ERRORS = registry.counter("provider_errors_total", "Provider call failures, by error class (RateLimitError, APIStatusError, BlockedPromptException, ...).", ("provider", "model", "error_type"))
+ROUTING_ATTEMPTS = registry.counter("routing_attempts_total", "Attempts made by routed requests, by outcome (success, error, cancelled) and whether a hedge started them.", ("provider", "model", "outcome", "hedge"))
+GENERATION_LATENCY = registry.histogram("generation_request_duration_seconds", "End-to-end latency of generation requests, by route and the provider/model that served them (\"mixed\" for batches over several models).", ("route", "provider", "model"))
+SCHEDULER_WAIT = registry.histogram("scheduler_wait_seconds", "Time spent queued in the provider scheduler before admission.", ("provider", "priority"))
+
+
+# Per-request timing breakdown, used for the optional Server-Timing response header.
+_request_timing: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timing", default=None)
+
+
+# Provider/model that served the current request, for GENERATION_LATENCY. A mutable dict like the timing
+# above, so values set inside the endpoint (or its tasks) are visible to the middleware afterwards.
+_request_target: ContextVar[Optional[Dict[str, str]]] = ContextVar("request_target", default=None)
+
+
+def add_request_timing(name: str, seconds: float):
+    timing = _request_timing.get()
+    if timing is not None:
+        timing[name] = timing.get(name, 0.0) + seconds
+
+
+def set_request_target(provider: str, model: str):
+    target = _request_target.get()
+    if target is None:
+        return
+    for label, value in (("provider", provider), ("model", model)):
+        target[label] = value if target.get(label, value) == value else "mixed"
+
+
+class ProviderCall:
+    def __init__(self, provider: str, model: str, operation: str):
+        self.provider = provider
+        self.model = model
+        self.operation = operation
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+
+    def first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            ttft = self.first_token_at - self.started_at
+            PROVIDER_TTFT.observe(ttft, provider=self.provider, model=self.model)
+            add_request_timing("ttft", ttft)
+
+    def usage(self, result):
+        input_tokens = getattr(result, "input_tokens", None)
+        output_tokens = getattr(result, "output_tokens", None)
+        if input_tokens is not None:
+            PROVIDER_TOKENS.inc(input_tokens, provider=self.provider, model=self.model, direction="input")
+        if output_tokens is not None:
+            PROVIDER_TOKENS.inc(output_tokens, provider=self.provider, model=self.model, direction="output")
+            PROVIDER_TOKENS_PER_CALL.observe(output_tokens, provider=self.provider, model=self.model)
+
+
+@asynccontextmanager
+async def provider_call(provider: str, model: str, operation: str):
+    # Wraps one upstream attempt (inside the scheduler slot, so queueing isn't counted as upstream time).
+    call = ProviderCall(provider, model, operation)
+    PROVIDER_IN_FLIGHT.inc(provider=provider, model=model)
+    outcome = "error"
+    try:
+        yield call
+        outcome = "success"
+    except BaseException as e:
+        if isinstance(e, Exception):
+            PROVIDER_ERRORS.inc(provider=provider, model=model, error_type=getattr(e, "error_type", None) or type(e).__name__)
+        else:
+            outcome = "cancelled"
+        raise
+    finally:
+        elapsed = time.perf_counter() - call.started_at
+        PROVIDER_IN_FLIGHT.dec(provider=provider, model=model)
+        PROVIDER_LATENCY.observe(elapsed, provider=provider, model=model, operation=operation)
+        PROVIDER_REQUESTS.inc(provider=provider, model=model, operation=operation, outcome=outcome)
+        add_request_timing("upstream", elapsed)
+
+
+def observe_scheduler_wait(provider: str, priority: str, wait_seconds: float):
+    SCHEDULER_WAIT.observe(wait_seconds, provider=provider, priority=priority)
+    add_request_timing("queue", wait_seconds)
+
+
+def format_server_timing(timing: Dict[str, float], total_seconds: float) -> str:
+    entries = [f"total;dur={total_seconds * 1000:.1f}"]
+    entries.extend(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timing.items())
+    return ", ".join(entries)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status and in-flight counts.
+
+    Latency runs until the last body chunk is sent, so streamed responses are measured end to end.
+    With timing_header=True (or an "X-Request-Timing: 1" request header) responses carry a
+    Server-Timing header with the total/queue/upstream/ttft breakdown known when headers are sent.
+    """
+
+    def __init__(self, app, timing_header: bool = False, excluded_paths: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.timing_header = timing_header
+        self.excluded_paths = set(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        timing: Dict[str, float] = {}
+        token = _request_timing.set(timing)
+        target: Dict[str, str] = {}
+        target_token = _request_target.set(target)
+        wants_timing = self.timing_header or (b"x-request-timing", b"1") in scope.get("headers", [])
+        status = {"code": 500}
+        HTTP_IN_FLIGHT.inc()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if wants_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", format_server_timing(timing, time.perf_counter() - started_at).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timing.reset(token)
+            _request_target.reset(target_token)
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route") # Set by the router; the template keeps /jobs/{id}-style paths to one series
+            route_label = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_LATENCY.observe(time.perf_counter() - started_at, method=method, route=route_label)
+            HTTP_REQUESTS.inc(method=method, route=route_label, status=status["code"])
+            if target:
+                GENERATION_LATENCY.observe(time.perf_counter() - started_at, route=route_label, provider=target["provider"], model=target["model"])
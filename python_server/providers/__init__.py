@@ -0,0 +1,33 @@
+from typing import Optional
+import os
+
+from .base import (
+    GenerationResult, Provider, ProviderAuthError, ProviderBlockedError, ProviderConnectionError, ProviderError,
+    ProviderRateLimitError, ProviderUnavailableError,
+)
+from .client_pool import ClientPool
+from .registry import ProviderRegistry, ProviderSpec
+
+# Provider modules (and their SDKs) are imported on first use; see registry.py. To add a provider, implement
+# Provider in a new module and register it here with the model prefixes it serves.
+# ANTHROPIC_BASE_URL / GEMINI_BASE_URL point the clients somewhere else, e.g. the fake servers in bench/.
+registry = ProviderRegistry()
+registry.register("anthropic", ("claude-",), ".anthropic_provider:AnthropicProvider", base_url=os.environ.get("ANTHROPIC_BASE_URL"))
+registry.register("gemini", ("gemini-",), ".gemini_provider:GeminiProvider", base_url=os.environ.get("GEMINI_BASE_URL"))
+
+
+def get_provider(name: str) -> Provider:
+    return registry.get(name)
+
+
+def get_provider_for_model(model_id: str) -> Optional[Provider]:
+    return registry.for_model(model_id)
+
+
+# The async variants import a not-yet-loaded provider in a worker thread; use them from request handlers.
+async def load_provider(name: str) -> Provider:
+    return await registry.aget(name)
+
+
+async def load_provider_for_model(model_id: str) -> Optional[Provider]:
+    return await registry.afor_model(model_id)
@@ -0,0 +1,100 @@
+from contextlib import contextmanager
+from typing import Optional
+import anthropic
+
+from .base import (
+    GenerationResult, Provider, ProviderAuthError, ProviderConnectionError, ProviderError,
+    ProviderRateLimitError, parse_retry_after,
+)
+
+VALIDATION_MODEL = "claude-3-haiku-20240307" # Known cheap/fast model used for key validation
+
+
+@contextmanager
+def translate_anthropic_errors():
+    try:
+        yield
+    except anthropic.AuthenticationError as e:
+        raise ProviderAuthError("Invalid Anthropic API Key (AuthenticationError).", error_type=type(e).__name__,
+                                raw_error=str(e)) from e
+    except anthropic.APIConnectionError as e:
+        raise ProviderConnectionError(f"Anthropic server could not be reached: {e.__cause__}",
+                                      error_type=type(e).__name__, raw_error=str(e)) from e
+    except anthropic.RateLimitError as e:
+        raise ProviderRateLimitError("Anthropic API rate limit exceeded.", error_type=type(e).__name__, raw_error=str(e),
+                                     retry_after=parse_retry_after(e.response.headers.get("retry-after"))) from e
+    except anthropic.APIStatusError as e:
+        try:
+            error_body = e.response.json()
+        except ValueError:
+            error_body = e.response.text
+        raise ProviderError(f"Anthropic API error (Status {e.status_code})", status_code=e.status_code,
+                            error_type=type(e).__name__, raw_error=error_body,
+                            retry_after=parse_retry_after(e.response.headers.get("retry-after"))) from e
+
+
+class AnthropicProvider(Provider):
+    name = "anthropic"
+    display_name = "Anthropic"
+    env_var = "ANTHROPIC_API_KEY"
+    model_prefixes = ("claude-",)
+
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = base_url # None = the SDK default (which also honours ANTHROPIC_BASE_URL)
+
+    def create_client(self, api_key: str):
+        # AsyncAnthropic owns an httpx.AsyncClient, so connections are kept alive while the client is pooled.
+        # SDK retries are off: the backend scheduler owns retry/backoff so it can see and pace every attempt.
+        return anthropic.AsyncAnthropic(api_key=api_key, base_url=self.base_url, max_retries=0)
+
+    async def close_client(self, client) -> None:
+        await client.close()
+
+    async def generate(self, client, model_id, system_prompt, prompt, max_tokens) -> GenerationResult:
+        with translate_anthropic_errors():
+            response = await client.messages.create(
+                model=model_id,
+                max_tokens=max_tokens,
+                system=system_prompt,
+                messages=[{"role": "user", "content": prompt}]
+            )
+
+        script_text = ""
+        if response.content and isinstance(response.content, list):
+            for block in response.content:
+                if hasattr(block, 'text'):
+                    script_text += block.text
+        return GenerationResult(
+            text=script_text,
+            stop_reason=response.stop_reason,
+            input_tokens=response.usage.input_tokens if response.usage else None,
+            output_tokens=response.usage.output_tokens if response.usage else None,
+        )
+
+    async def stream(self, client, model_id, system_prompt, prompt, max_tokens):
+        with translate_anthropic_errors():
+            async with client.messages.stream(
+                model=model_id,
+                max_tokens=max_tokens,
+                system=system_prompt,
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                final_message = await stream.get_final_message()
+
+        yield GenerationResult(
+            text="".join(block.text for block in final_message.content if hasattr(block, 'text')),
+            stop_reason=final_message.stop_reason,
+            input_tokens=final_message.usage.input_tokens if final_message.usage else None,
+            output_tokens=final_message.usage.output_tokens if final_message.usage else None,
+        )
+
+    async def validate_key(self, client) -> None:
+        # Initializing the client with a bad key doesn't error until a real call, so send a 1-token message.
+        with translate_anthropic_errors():
+            await client.messages.create(
+                model=VALIDATION_MODEL,
+                max_tokens=1,
+                messages=[{"role": "user", "content": "ping"}]
+            )
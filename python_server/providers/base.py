@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional, Union
+import os
+
+
+@dataclass
+class GenerationResult:
+    text: str
+    stop_reason: Optional[str] = None
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+
+# Provider-neutral errors. Each provider translates its SDK/HTTP errors into one of these so the
+# endpoints in main.py don't need to know which library raised them.
+class ProviderError(Exception):
+    status_code = 500
+
+    def __init__(self, message: str, *, status_code: Optional[int] = None, error_type: Optional[str] = None,
+                 raw_error=None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.message = message
+        if status_code is not None:
+            self.status_code = status_code
+        self.error_type = error_type or type(self).__name__ # Original exception class / API status, for logs and clients
+        self.raw_error = raw_error if raw_error is not None else message
+        self.retry_after = retry_after # Seconds, when the upstream sent a retry-after hint
+
+
+class ProviderAuthError(ProviderError):
+    status_code = 401
+
+
+class ProviderRateLimitError(ProviderError):
+    status_code = 429
+
+
+class ProviderConnectionError(ProviderError):
+    status_code = 503
+
+
+class ProviderBlockedError(ProviderError):
+    status_code = 400
+
+
+class ProviderUnavailableError(ProviderError):
+    # The provider's module or SDK failed to import (e.g. its optional package isn't installed).
+    status_code = 503
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None # HTTP-date form; not worth parsing for our purposes
+
+
+class Provider:
+    name = ""
+    display_name = ""
+    env_var = ""
+    model_prefixes = ()
+
+    def matches(self, model_id: str) -> bool:
+        return model_id.startswith(self.model_prefixes)
+
+    def resolve_api_key(self, api_key: Optional[str]) -> Optional[str]:
+        return api_key or os.environ.get(self.env_var)
+
+    def create_client(self, api_key: str):
+        raise NotImplementedError
+
+    async def close_client(self, client) -> None:
+        raise NotImplementedError
+
+    async def generate(self, client, model_id: str, system_prompt: str, prompt: str, max_tokens: int) -> GenerationResult:
+        raise NotImplementedError
+
+    def stream(self, client, model_id: str, system_prompt: str, prompt: str,
+               max_tokens: int) -> AsyncIterator[Union[str, GenerationResult]]:
+        # Async generator: yields text deltas, then a single GenerationResult (text may be empty) as the last item.
+        raise NotImplementedError
+
+    async def validate_key(self, client) -> None:
+        # Returns normally if the key works, raises a ProviderError otherwise.
+        raise NotImplementedError
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledClient:
+    def __init__(self, provider, client):
+        self.provider = provider
+        self.client = client
+        self.leases = 0
+        self.evicted = False
+
+
+class ClientPool:
+    """Bounded LRU pool of async provider clients keyed by (provider, api key).
+
+    Clients keep their HTTP connections alive between requests. A client evicted while a request
+    is still using it is closed when the last lease is released, never underneath a live call.
+    """
+
+    def __init__(self, max_size: int = 16):
+        self.max_size = max(1, max_size)
+        self._clients = OrderedDict() # (provider name, api key) -> _PooledClient
+
+    def __len__(self):
+        return len(self._clients)
+
+    @asynccontextmanager
+    async def lease(self, provider, api_key: str):
+        pool_key = (provider.name, api_key)
+        entry = self._clients.get(pool_key)
+        if entry is None:
+            entry = _PooledClient(provider, provider.create_client(api_key))
+            self._clients[pool_key] = entry
+            await self._evict_overflow()
+        else:
+            self._clients.move_to_end(pool_key)
+
+        entry.leases += 1
+        try:
+            yield entry.client
+        finally:
+            entry.leases -= 1
+            if entry.evicted and entry.leases == 0:
+                await self._close(entry)
+
+    async def _evict_overflow(self):
+        while len(self._clients) > self.max_size:
+            _, oldest = self._clients.popitem(last=False)
+            oldest.evicted = True
+            if oldest.leases == 0:
+                await self._close(oldest)
+
+    async def _close(self, entry: _PooledClient):
+        try:
+            await entry.provider.close_client(entry.client)
+        except Exception:
+            logger.exception(f"Error closing pooled {entry.provider.name} client")
+
+    async def close_all(self):
+        entries = list(self._clients.values())
+        self._clients.clear()
+        for entry in entries:
+            entry.evicted = True
+            if entry.leases == 0:
+                await self._close(entry)
@@ -0,0 +1,146 @@
+from contextlib import asynccontextmanager
+from typing import Optional
+import json
+import httpx
+
+from .base import (
+    GenerationResult, Provider, ProviderAuthError, ProviderBlockedError, ProviderConnectionError, ProviderError,
+    ProviderRateLimitError, parse_retry_after,
+)
+
+# Gemini is called over its REST API with one httpx.AsyncClient per key (key sent as a header).
+# google.generativeai only supports a process-global genai.configure(api_key=...), which races when two
+# requests use different keys, and its list_models() call is blocking.
+GEMINI_API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/"
+GEMINI_TIMEOUT = httpx.Timeout(600.0, connect=10.0) # Long scripts can take minutes to generate
+
+
+def _gemini_error_from_response(response: httpx.Response, body: bytes) -> ProviderError:
+    try:
+        error = json.loads(body).get("error", {})
+    except (ValueError, AttributeError):
+        error = {}
+    message = error.get("message") or body.decode("utf-8", "replace") or f"HTTP {response.status_code}"
+    api_status = error.get("status") or f"HTTP{response.status_code}" # e.g. PERMISSION_DENIED, RESOURCE_EXHAUSTED
+    raw_error = error or body.decode("utf-8", "replace")
+    retry_after = parse_retry_after(response.headers.get("retry-after"))
+
+    reasons = {detail.get("reason") for detail in error.get("details", []) if isinstance(detail, dict)}
+    # Only a rejected key is an auth error (it gets the key marked invalid for every model). Gemini also answers
+    # 403 PERMISSION_DENIED for a model or project the key can't use; that falls through to a plain ProviderError.
+    if response.status_code == 401 or "API_KEY_INVALID" in reasons:
+        return ProviderAuthError(f"Invalid Google API Key ({api_status}): {message}", error_type=api_status, raw_error=raw_error)
+    if response.status_code == 429:
+        return ProviderRateLimitError(f"Gemini API rate limit exceeded: {message}", error_type=api_status,
+                                      raw_error=raw_error, retry_after=retry_after)
+    return ProviderError(f"Gemini API error (Status {response.status_code}): {message}", status_code=response.status_code,
+                         error_type=api_status, raw_error=raw_error, retry_after=retry_after)
+
+
+@asynccontextmanager
+async def translate_gemini_errors():
+    try:
+        yield
+    except httpx.TimeoutException as e:
+        raise ProviderConnectionError(f"Gemini API request timed out: {e}", error_type=type(e).__name__) from e
+    except httpx.TransportError as e:
+        raise ProviderConnectionError(f"Gemini server could not be reached: {e}", error_type=type(e).__name__) from e
+
+
+def _raise_for_status(response: httpx.Response, body: bytes):
+    if response.status_code >= 400:
+        raise _gemini_error_from_response(response, body)
+
+
+def _check_blocked(payload: dict):
+    feedback = payload.get("promptFeedback") or {}
+    if feedback.get("blockReason"):
+        block_reason_message = feedback.get("blockReasonMessage") or f"Content blocked ({feedback['blockReason']})"
+        raise ProviderBlockedError(f"Gemini content generation blocked: {block_reason_message}",
+                                   error_type="BlockedPromptException", raw_error=feedback)
+
+
+def _candidate_text(payload: dict) -> str:
+    candidates = payload.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+def _finish_reason(payload: dict):
+    candidates = payload.get("candidates") or []
+    return candidates[0].get("finishReason") if candidates else None
+
+
+class GeminiProvider(Provider):
+    name = "gemini"
+    display_name = "Gemini"
+    env_var = "GOOGLE_API_KEY"
+    model_prefixes = ("gemini-",)
+
+    def __init__(self, base_url: Optional[str] = None):
+        # Relative request paths below need the trailing slash on the base URL.
+        self.base_url = (base_url or GEMINI_API_BASE_URL).rstrip("/") + "/"
+
+    def create_client(self, api_key: str):
+        return httpx.AsyncClient(base_url=self.base_url, headers={"x-goog-api-key": api_key}, timeout=GEMINI_TIMEOUT)
+
+    async def close_client(self, client) -> None:
+        await client.aclose()
+
+    def _request_body(self, system_prompt: str, prompt: str, max_tokens: int) -> dict:
+        return {
+            "systemInstruction": {"parts": [{"text": system_prompt}]},
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "generationConfig": {"maxOutputTokens": max_tokens},
+        }
+
+    async def generate(self, client, model_id, system_prompt, prompt, max_tokens) -> GenerationResult:
+        async with translate_gemini_errors():
+            response = await client.post(f"models/{model_id}:generateContent",
+                                         json=self._request_body(system_prompt, prompt, max_tokens))
+        _raise_for_status(response, response.content)
+        payload = response.json()
+        _check_blocked(payload)
+        usage = payload.get("usageMetadata") or {}
+        return GenerationResult(
+            text=_candidate_text(payload),
+            stop_reason=_finish_reason(payload),
+            input_tokens=usage.get("promptTokenCount"),
+            output_tokens=usage.get("candidatesTokenCount"),
+        )
+
+    async def stream(self, client, model_id, system_prompt, prompt, max_tokens):
+        text_parts = []
+        stop_reason = None
+        usage = {}
+        async with translate_gemini_errors():
+            async with client.stream("POST", f"models/{model_id}:streamGenerateContent", params={"alt": "sse"},
+                                     json=self._request_body(system_prompt, prompt, max_tokens)) as response:
+                if response.status_code >= 400:
+                    _raise_for_status(response, await response.aread())
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    chunk = json.loads(line[len("data:"):])
+                    _check_blocked(chunk)
+                    text = _candidate_text(chunk)
+                    if text:
+                        text_parts.append(text)
+                        yield text
+                    stop_reason = _finish_reason(chunk) or stop_reason
+                    usage = chunk.get("usageMetadata") or usage
+
+        yield GenerationResult(
+            text="".join(text_parts),
+            stop_reason=stop_reason,
+            input_tokens=usage.get("promptTokenCount"),
+            output_tokens=usage.get("candidatesTokenCount"),
+        )
+
+    async def validate_key(self, client) -> None:
+        # Listing a single model is a free call that still checks authentication.
+        async with translate_gemini_errors():
+            response = await client.get("models", params={"pageSize": 1})
+        _raise_for_status(response, response.content)
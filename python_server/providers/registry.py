@@ -0,0 +1,117 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Tuple
+import asyncio
+import importlib
+import logging
+import threading
+import time
+
+from .base import Provider, ProviderError, ProviderUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# Providers are registered by name, model prefixes and an import path, and their module (and SDK) is only
+# imported the first time one of their models is used. Server startup doesn't pay for SDKs that are never
+# called, and adding a provider is one register() call - the endpoints only ever see the Provider interface.
+# Request handlers use aget()/afor_model(), which import in a worker thread so a first-use import (or waiting
+# for the warm-up thread's import) never blocks the event loop. A failed import is remembered for
+# failure_ttl_seconds so requests for a missing SDK fail fast instead of retrying the import every time.
+
+
+@dataclass
+class ProviderSpec:
+    name: str
+    model_prefixes: Tuple[str, ...]
+    target: str # "module:ClassName"; a leading "." is relative to this package
+    options: Dict[str, Any] = field(default_factory=dict) # Constructor kwargs
+
+
+class ProviderRegistry:
+    def __init__(self, failure_ttl_seconds: float = 30.0):
+        self.failure_ttl_seconds = failure_ttl_seconds
+        self._specs: Dict[str, ProviderSpec] = {}
+        self._loaded: Dict[str, Provider] = {}
+        self._failures: Dict[str, Tuple[float, ProviderUnavailableError]] = {} # name -> (retry after, monotonic; error)
+        self._lock = threading.Lock() # Warm-up and request threads may load the same provider at once
+
+    def register(self, name: str, model_prefixes: Iterable[str], target: str, **options) -> ProviderSpec:
+        spec = ProviderSpec(name, tuple(model_prefixes), target, options)
+        with self._lock:
+            self._specs[name] = spec
+            self._loaded.pop(name, None)
+            self._failures.pop(name, None)
+        return spec
+
+    def names(self) -> Tuple[str, ...]:
+        return tuple(self._specs)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def get(self, name: str) -> Provider:
+        # Blocking: may import the provider's SDK. Prefer aget() on the event loop.
+        provider = self._loaded.get(name)
+        if provider is not None:
+            return provider
+        spec = self._specs[name] # KeyError for unregistered names, like the old PROVIDERS dict
+        self._raise_recent_failure(name)
+        with self._lock:
+            provider = self._loaded.get(name)
+            if provider is None:
+                self._raise_recent_failure(name) # Another thread may have just failed while we waited
+                try:
+                    provider = self._loaded[name] = self._load(spec)
+                except ProviderUnavailableError as e:
+                    self._failures[name] = (time.monotonic() + self.failure_ttl_seconds, e)
+                    raise
+                self._failures.pop(name, None)
+        return provider
+
+    async def aget(self, name: str) -> Provider:
+        provider = self._loaded.get(name)
+        if provider is not None:
+            return provider
+        return await asyncio.to_thread(self.get, name)
+
+    def spec_for_model(self, model_id: str) -> Optional[ProviderSpec]:
+        for spec in self._specs.values():
+            if model_id.startswith(spec.model_prefixes):
+                return spec
+        return None
+
+    def for_model(self, model_id: str) -> Optional[Provider]:
+        spec = self.spec_for_model(model_id)
+        return self.get(spec.name) if spec else None
+
+    async def afor_model(self, model_id: str) -> Optional[Provider]:
+        spec = self.spec_for_model(model_id)
+        return await self.aget(spec.name) if spec else None
+
+    def load_all(self, names: Optional[Iterable[str]] = None) -> Dict[str, Optional[float]]:
+        # Imports every (or the named) provider up front; returns seconds taken per provider, None for failures.
+        timings = {}
+        for name in names or self.names():
+            started = time.perf_counter()
+            try:
+                self.get(name)
+                timings[name] = time.perf_counter() - started
+            except ProviderError as e:
+                logger.warning(f"Provider '{name}' could not be loaded: {e.message}")
+                timings[name] = None
+        return timings
+
+    def _raise_recent_failure(self, name: str):
+        failure = self._failures.get(name)
+        if failure is not None and failure[0] > time.monotonic():
+            raise failure[1]
+
+    def _load(self, spec: ProviderSpec) -> Provider:
+        module_name, _, class_name = spec.target.partition(":")
+        started = time.perf_counter()
+        try:
+            module = importlib.import_module(module_name, package=__package__)
+        except ImportError as e:
+            raise ProviderUnavailableError(f"Provider '{spec.name}' is unavailable: {e}", raw_error=str(e)) from e
+        provider = getattr(module, class_name)(**spec.options)
+        logger.info(f"Loaded provider '{spec.name}' ({spec.target}) in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return provider
@@ -0,0 +1,217 @@
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+import asyncio
+import logging
+import time
+
+from scheduler import is_retryable
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Multi-provider routing: a request names several equivalent models, candidates are ordered using observed
+# per-provider latency and error rates, retryable failures fail over to the next candidate, and an optional
+# hedge starts the next candidate when the current one is slower than usual. The first success wins and the
+# other attempt is cancelled, which also closes its upstream request.
+
+
+@dataclass
+class _Health:
+    latency: Optional[float] = None # EWMA of successful call latency, seconds
+    deviation: float = 0.0 # EWMA of |latency - mean|, for the hedge delay
+    error_rate: float = 0.0 # EWMA of the failure indicator (retryable failures only)
+    samples: int = 0
+    consecutive_failures: int = 0
+    cooldown_until: float = 0.0 # monotonic; skipped (tried last) until then
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "deviation_ms": round(self.deviation * 1000, 1),
+            "error_rate": round(self.error_rate, 4),
+            "samples": self.samples,
+            "consecutive_failures": self.consecutive_failures,
+            "cooldown_seconds": round(max(0.0, self.cooldown_until - now), 1),
+        }
+
+
+class HealthTracker:
+    """Per provider and per model latency/error statistics fed by every provider call.
+
+    Model-level stats are used when the model has been seen; otherwise the provider's aggregate is used.
+    After failure_threshold consecutive failures a model (or provider) cools down for cooldown_seconds.
+    """
+
+    def __init__(self, alpha: float = 0.2, failure_threshold: int = 3, cooldown_seconds: float = 30.0,
+                 unhealthy_error_rate: float = 0.5):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.unhealthy_error_rate = unhealthy_error_rate
+        self._health: Dict[Tuple[str, Optional[str]], _Health] = {}
+
+    def observe(self, provider: str, model: str, seconds: float, ok: bool):
+        now = time.monotonic()
+        for key in ((provider, model), (provider, None)):
+            health = self._health.setdefault(key, _Health())
+            health.samples += 1
+            health.error_rate += self.alpha * ((0.0 if ok else 1.0) - health.error_rate)
+            if ok:
+                health.consecutive_failures = 0
+                health.cooldown_until = 0.0
+                if health.latency is None:
+                    health.latency = seconds
+                else:
+                    health.deviation += self.alpha * (abs(seconds - health.latency) - health.deviation)
+                    health.latency += self.alpha * (seconds - health.latency)
+            else:
+                health.consecutive_failures += 1
+                if health.consecutive_failures >= self.failure_threshold:
+                    health.cooldown_until = now + self.cooldown_seconds
+
+    def _get(self, provider: str, model: str) -> Optional[_Health]:
+        health = self._health.get((provider, model))
+        if health is None or health.samples == 0:
+            health = self._health.get((provider, None))
+        return health
+
+    def healthy(self, provider: str, model: str) -> bool:
+        health = self._get(provider, model)
+        if health is None:
+            return True
+        if health.cooldown_until > time.monotonic():
+            return False
+        return not (health.samples >= 5 and health.error_rate > self.unhealthy_error_rate)
+
+    def expected_latency(self, provider: str, model: str) -> Optional[float]:
+        # Latency inflated by the error rate, since a failure costs a second attempt elsewhere.
+        health = self._get(provider, model)
+        if health is None or health.latency is None:
+            return None
+        return health.latency * (1 + 2 * health.error_rate)
+
+    def hedge_delay(self, provider: str, model: str, default: float) -> float:
+        # Roughly "slower than usual": mean plus two deviations of observed latency.
+        health = self._get(provider, model)
+        if health is None or health.latency is None or health.samples < 3:
+            return default
+        return health.latency + 2 * health.deviation
+
+    def order(self, candidates: Sequence[Tuple[str, str]], strategy: str = "ordered") -> List[int]:
+        """Returns candidate indexes in the order to try them. Unhealthy candidates always go last (they are
+        still tried if everything else fails). "ordered" keeps the caller's preference among healthy ones;
+        "fastest" sorts them by expected latency, with models that have no data yet after measured ones."""
+        indexes = list(range(len(candidates)))
+        if strategy == "fastest":
+            def latency_key(i: int):
+                expected = self.expected_latency(*candidates[i])
+                return (expected is None, expected or 0.0, i)
+            indexes.sort(key=latency_key)
+        return sorted(indexes, key=lambda i: not self.healthy(*candidates[i])) # Stable: keeps the order above
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        stats: Dict[str, dict] = {}
+        for (provider, model), health in sorted(self._health.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+            entry = stats.setdefault(provider, {"models": {}})
+            if model is None:
+                entry.update(health.to_dict(now))
+            else:
+                entry["models"][model] = health.to_dict(now)
+        return stats
+
+
+@dataclass
+class Attempt:
+    index: int # Position in the candidate list passed to Router.run
+    hedge: bool # Started by the hedge timer rather than as a failover
+    started_at: float
+    elapsed: Optional[float] = None
+    outcome: str = "running" # success / error / cancelled
+    error: Optional[Exception] = None
+
+
+@dataclass
+class RouteResult(Generic[T]):
+    value: T
+    index: int
+    attempts: List[Attempt] = field(default_factory=list)
+
+
+class RouteError(Exception):
+    # Every candidate failed (or a non-retryable error stopped the failover); error is the one to report.
+    def __init__(self, error: Exception, attempts: List[Attempt]):
+        super().__init__(str(error))
+        self.error = error
+        self.attempts = attempts
+
+
+class Router:
+    def __init__(self, max_hedges: int = 1):
+        self.max_hedges = max_hedges
+
+    async def run(self, candidate_count: int, attempt: Callable[[int], Awaitable[T]],
+                  hedge_after: Optional[float] = None) -> RouteResult[T]:
+        """Tries candidates 0..candidate_count-1 via attempt(index).
+
+        A retryable failure starts the next candidate right away; a non-retryable one stops new attempts
+        (attempts already running may still win). With hedge_after, if the latest attempt hasn't finished
+        after that many seconds the next candidate is started alongside it (at most max_hedges times).
+        """
+        attempts: List[Attempt] = []
+        pending: Dict[asyncio.Task, Attempt] = {}
+        next_index = 0
+        hedges = 0
+        last_launch = 0.0
+        stop = False
+        final_error: Optional[Exception] = None
+
+        def launch(hedge: bool):
+            nonlocal next_index, last_launch
+            record = Attempt(next_index, hedge, time.perf_counter())
+            attempts.append(record)
+            pending[asyncio.create_task(attempt(next_index))] = record
+            next_index += 1
+            last_launch = time.monotonic()
+
+        launch(False)
+        try:
+            while pending:
+                timeout = None
+                can_hedge = hedge_after is not None and hedges < self.max_hedges and next_index < candidate_count and not stop
+                if can_hedge:
+                    timeout = max(0.0, last_launch + hedge_after - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Hedging: candidate {next_index - 1} still running after {hedge_after:.2f}s, starting candidate {next_index}")
+                    hedges += 1
+                    launch(True)
+                    continue
+                for task in done:
+                    record = pending.pop(task)
+                    record.elapsed = time.perf_counter() - record.started_at
+                    error = task.exception()
+                    if error is None:
+                        record.outcome = "success"
+                        return RouteResult(task.result(), record.index, attempts)
+                    record.outcome = "error"
+                    record.error = error
+                    if not is_retryable(error):
+                        # Not a provider health problem (bad key, blocked prompt, ...): report it rather than hiding
+                        # it behind a later candidate's error.
+                        stop = True
+                        final_error = final_error or error
+                    elif final_error is None or is_retryable(final_error):
+                        final_error = error
+                if not stop and next_index < candidate_count:
+                    logger.info(f"Failing over to candidate {next_index} after: {type(final_error).__name__}: {final_error}")
+                    launch(False)
+            raise RouteError(final_error, attempts)
+        finally:
+            for task, record in pending.items():
+                task.cancel()
+                record.outcome = "cancelled"
+                record.elapsed = time.perf_counter() - record.started_at
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,353 @@
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+
+from providers import ProviderConnectionError, ProviderError, ProviderRateLimitError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Lower number = served first. Interactive generations jump ahead of background and batch work.
+PRIORITIES = {"interactive": 0, "background": 1, "batch": 2}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529} # 529 = Anthropic "overloaded"
+
+
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, (ProviderRateLimitError, ProviderConnectionError)):
+        return True
+    return isinstance(e, ProviderError) and e.status_code in RETRYABLE_STATUS_CODES
+
+
+def estimate_tokens(*texts: str, max_tokens: int = 0) -> int:
+    # Rough budget used for tokens-per-minute admission (~4 characters per token) plus the output ceiling.
+    return sum(len(text) for text in texts if text) // 4 + max_tokens
+
+
+@dataclass
+class Limits:
+    max_concurrency: Optional[int] = None
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Limits":
+        return cls(
+            max_concurrency=config.get("max_concurrency"),
+            requests_per_minute=config.get("requests_per_minute"),
+            tokens_per_minute=config.get("tokens_per_minute"),
+        )
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0 # Refill per second
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity) # A single oversized request must still be admissible eventually
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        # Negative amounts charge extra, e.g. when actual usage exceeded the estimate.
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Lane:
+    # One limiter scope: a whole provider, or one model within it.
+
+    def __init__(self, limits: Limits):
+        self.limits = limits
+        self.active = 0
+        self.requests = TokenBucket(limits.requests_per_minute) if limits.requests_per_minute else None
+        self.tokens = TokenBucket(limits.tokens_per_minute) if limits.tokens_per_minute else None
+        self.paused_until = 0.0 # Set from retry-after when the upstream rate limits us
+
+    def wait_time(self, estimated_tokens: int) -> Optional[float]:
+        # None = blocked on concurrency (wait for a release); otherwise seconds until admissible (0 = now).
+        if self.limits.max_concurrency is not None and self.active >= self.limits.max_concurrency:
+            return None
+        waits = [self.paused_until - time.monotonic()]
+        if self.requests is not None:
+            waits.append(self.requests.wait_time(1))
+        if self.tokens is not None:
+            waits.append(self.tokens.wait_time(estimated_tokens))
+        return max(0.0, *waits)
+
+    def admit(self, estimated_tokens: int):
+        self.active += 1
+        if self.requests is not None:
+            self.requests.consume(1)
+        if self.tokens is not None:
+            self.tokens.consume(estimated_tokens)
+
+    def release(self, token_refund: float):
+        self.active -= 1
+        if self.tokens is not None and token_refund:
+            self.tokens.refund(token_refund)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    model: str = field(compare=False)
+    estimated_tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+@dataclass
+class Ticket:
+    provider: str
+    model: str
+    estimated_tokens: int
+    wait_seconds: float
+
+
+class _ProviderQueue:
+    def __init__(self, limits: Limits, model_limits: Dict[str, Limits]):
+        self.lane = _Lane(limits)
+        self.model_limits = model_limits
+        self.model_lanes: Dict[str, _Lane] = {}
+        self.waiters: List[_Waiter] = []
+        self.wakeup: Optional[asyncio.TimerHandle] = None
+        self.admitted = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    def model_lane(self, model: str) -> Optional[_Lane]:
+        if model not in self.model_limits:
+            return None
+        if model not in self.model_lanes:
+            self.model_lanes[model] = _Lane(self.model_limits[model])
+        return self.model_lanes[model]
+
+
+class ProviderScheduler:
+    """Admission control in front of every provider call.
+
+    Each provider (and optionally each model) has a concurrency cap and requests/tokens-per-minute token
+    buckets. Callers queue by priority; retryable failures are retried with jittered exponential backoff
+    that honours the upstream's retry-after hint and pauses the whole provider lane meanwhile.
+    """
+
+    def __init__(self, config: Dict[str, dict], max_retries: int = 3, base_backoff_seconds: float = 1.0,
+                 max_backoff_seconds: float = 30.0,
+                 on_admit: Optional[Callable[[str, str, str, float], None]] = None):
+        self.config = config
+        self.on_admit = on_admit # (provider, model, priority name, seconds waited), e.g. for metrics
+        self.max_retries = max_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._queues: Dict[str, _ProviderQueue] = {}
+        self._seq = itertools.count()
+
+    def _queue(self, provider: str) -> _ProviderQueue:
+        queue = self._queues.get(provider)
+        if queue is None:
+            provider_config = self.config.get(provider, {})
+            model_limits = {model: Limits.from_config(cfg) for model, cfg in provider_config.get("models", {}).items()}
+            queue = _ProviderQueue(Limits.from_config(provider_config), model_limits)
+            self._queues[provider] = queue
+        return queue
+
+    async def acquire(self, provider: str, model: str, priority: str = "interactive", estimated_tokens: int = 0) -> Ticket:
+        queue = self._queue(provider)
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(PRIORITIES.get(priority, PRIORITIES["interactive"]), next(self._seq), model,
+                         estimated_tokens, loop.create_future(), time.monotonic())
+        heapq.heappush(queue.waiters, waiter)
+        self._dispatch(provider)
+        try:
+            ticket = await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted at the same moment the caller gave up; hand the slot back.
+                self.release(waiter.future.result())
+            else:
+                waiter.future.cancel()
+                self._dispatch(provider)
+            raise
+        # Reported here rather than in _dispatch, which usually runs in the task that released a slot:
+        # callbacks that use context variables (per-request timing) must see the waiter's own context.
+        if self.on_admit is not None:
+            self.on_admit(provider, model, PRIORITY_NAMES[waiter.priority], ticket.wait_seconds)
+        return ticket
+
+    def release(self, ticket: Ticket, actual_tokens: Optional[int] = None):
+        queue = self._queue(ticket.provider)
+        refund = ticket.estimated_tokens - actual_tokens if actual_tokens is not None else 0
+        queue.lane.release(refund)
+        model_lane = queue.model_lane(ticket.model)
+        if model_lane is not None:
+            model_lane.release(refund)
+        self._dispatch(ticket.provider)
+
+    def _dispatch(self, provider: str):
+        queue = self._queue(provider)
+        if queue.wakeup is not None:
+            queue.wakeup.cancel()
+            queue.wakeup = None
+
+        next_wakeup = None
+        blocked = []
+        while queue.waiters:
+            waiter = heapq.heappop(queue.waiters)
+            if waiter.future.done(): # Cancelled while queued
+                continue
+            provider_wait = queue.lane.wait_time(waiter.estimated_tokens)
+            if provider_wait is None or provider_wait > 0:
+                # Provider-wide limit: nothing queued behind this waiter could run either.
+                blocked.append(waiter)
+                if provider_wait:
+                    next_wakeup = provider_wait
+                break
+            model_lane = queue.model_lane(waiter.model)
+            model_wait = model_lane.wait_time(waiter.estimated_tokens) if model_lane is not None else 0.0
+            if model_wait is None or model_wait > 0:
+                # Only this model is saturated; let other models' waiters through.
+                blocked.append(waiter)
+                if model_wait:
+                    next_wakeup = model_wait if next_wakeup is None else min(next_wakeup, model_wait)
+                continue
+
+            queue.lane.admit(waiter.estimated_tokens)
+            if model_lane is not None:
+                model_lane.admit(waiter.estimated_tokens)
+            waited = time.monotonic() - waiter.enqueued_at
+            queue.admitted += 1
+            queue.wait_seconds_total += waited
+            queue.max_wait_seconds = max(queue.max_wait_seconds, waited)
+            waiter.future.set_result(Ticket(provider, waiter.model, waiter.estimated_tokens, waited))
+
+        for waiter in blocked:
+            heapq.heappush(queue.waiters, waiter)
+        if next_wakeup is not None:
+            queue.wakeup = asyncio.get_running_loop().call_later(next_wakeup, self._dispatch, provider)
+
+    @asynccontextmanager
+    async def slot(self, provider: str, model: str, priority: str = "interactive", estimated_tokens: int = 0):
+        ticket = await self.acquire(provider, model, priority, estimated_tokens)
+        usage = {"tokens": None} # Callers may fill in actual usage so the tokens bucket is corrected
+        try:
+            yield usage
+        except ProviderRateLimitError as e:
+            # Pause before releasing: release() dispatches the next waiter, which must not go straight out
+            # into the same 429. Applies whether or not this caller retries.
+            self._pause(provider, e)
+            raise
+        finally:
+            self.release(ticket, usage["tokens"])
+
+    def _pause(self, provider: str, e: ProviderRateLimitError):
+        queue = self._queue(provider)
+        queue.rate_limited += 1
+        pause = e.retry_after if e.retry_after is not None else self.base_backoff_seconds
+        # Hold back everyone queued for this provider, not just the caller that hit the limit.
+        queue.lane.paused_until = max(queue.lane.paused_until, time.monotonic() + pause)
+
+    def _backoff(self, provider: str, model: str, attempt: int, e: ProviderError) -> float:
+        queue = self._queue(provider)
+        queue.retries += 1
+        delay = min(self.max_backoff_seconds, self.base_backoff_seconds * (2 ** attempt))
+        delay = random.uniform(delay / 2, delay) # Jitter so queued requests don't retry in lockstep
+        if isinstance(e, ProviderRateLimitError) and e.retry_after is not None:
+            delay = max(delay, e.retry_after) # The lane itself was already paused by slot()
+        logger.warning(f"{provider} call for {model} failed ({e.error_type}, status {e.status_code}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    async def run(self, provider: str, model: str, call: Callable[[], Awaitable[T]], priority: str = "interactive",
+                  estimated_tokens: int = 0, max_retries: Optional[int] = None) -> T:
+        retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            try:
+                async with self.slot(provider, model, priority, estimated_tokens) as usage:
+                    result = await call()
+                    usage["tokens"] = _result_tokens(result)
+                    return result
+            except ProviderError as e:
+                if attempt >= retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(provider, model, attempt, e)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def stream(self, provider: str, model: str, open_stream: Callable[[], AsyncIterator], priority: str = "interactive",
+                     estimated_tokens: int = 0, max_retries: Optional[int] = None) -> AsyncIterator:
+        # The slot is held for the whole stream. Retries only happen before the first item has been yielded,
+        # since the caller can't un-receive text that was already sent.
+        retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async with self.slot(provider, model, priority, estimated_tokens) as usage:
+                    async for item in open_stream():
+                        started = True
+                        usage["tokens"] = _result_tokens(item)
+                        yield item
+                    return
+            except ProviderError as e:
+                if started or attempt >= retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(provider, model, attempt, e)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        stats = {}
+        for provider, queue in self._queues.items():
+            live_waiters = [w for w in queue.waiters if not w.future.done()]
+            stats[provider] = {
+                "active": queue.lane.active,
+                "queued": len(live_waiters),
+                "queued_by_priority": {
+                    name: sum(1 for w in live_waiters if w.priority == value) for name, value in PRIORITIES.items()
+                },
+                "oldest_wait_seconds": round(max((now - w.enqueued_at for w in live_waiters), default=0.0), 3),
+                "admitted": queue.admitted,
+                "avg_wait_seconds": round(queue.wait_seconds_total / queue.admitted, 3) if queue.admitted else 0.0,
+                "max_wait_seconds": round(queue.max_wait_seconds, 3),
+                "retries": queue.retries,
+                "rate_limited": queue.rate_limited,
+                "paused_for_seconds": round(max(0.0, queue.lane.paused_until - now), 3),
+                "limits": vars(queue.lane.limits),
+                "models": {model: {"active": lane.active, "limits": vars(lane.limits)} for model, lane in queue.model_lanes.items()},
+            }
+        return stats
+
+
+def _result_tokens(result) -> Optional[int]:
+    input_tokens = getattr(result, "input_tokens", None)
+    output_tokens = getattr(result, "output_tokens", None)
+    if input_tokens is None and output_tokens is None:
+        return None
+    return (input_tokens or 0) + (output_tokens or 0)
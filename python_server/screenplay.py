@@ -0,0 +1,265 @@
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+import re
+
+# Parser for the Markdown screenplay format the SYSTEM_MESSAGE_SCRIPTING_* prompts ask for:
+# "## INT. COFFEE SHOP - DAY" scene headings, plain action paragraphs, ALL-CAPS character cues,
+# "(parentheticals)" on their own line and dialogue below the cue.
+#
+# Scenes keep their exact source text, so replacing one scene and re-joining leaves every other
+# scene byte-for-byte unchanged.
+
+_SETTINGS = r"(?P<setting>INT\./EXT\.|EXT\./INT\.|INT/EXT\.?|I/E\.?|INT\.|EXT\.)"
+# Without a Markdown heading marker only upper-case INT./EXT. count, so prose such as "Ext. notes ..." stays
+# action; after "#"s mixed case ("## Int. Kitchen - Day") is accepted too.
+SCENE_HEADING_RE = re.compile(r"^\s*(?:\*\*)?" + _SETTINGS + r"\s*(?P<rest>.*?)(?:\*\*)?\s*$")
+MARKDOWN_SCENE_HEADING_RE = re.compile(r"^\s*#{1,6}\s*(?:\*\*)?" + _SETTINGS + r"\s*(?P<rest>.*?)(?:\*\*)?\s*$", re.IGNORECASE)
+# An ALL-CAPS name, optionally with extensions like (V.O.), (O.S.), (CONT'D); may be wrapped in ** or indented.
+CHARACTER_CUE_RE = re.compile(r"^\s*(?:\*\*)?(?P<name>[A-Z][A-Z0-9 .'\-&]*?[A-Z0-9.'])(?:\s*\((?P<extension>[^)]*)\))?(?:\*\*)?\s*$")
+PARENTHETICAL_RE = re.compile(r"^\s*\(.*\)\s*$")
+# ALL-CAPS lines that are not character cues.
+NON_CHARACTER_LINES = re.compile(r"^(FADE (IN|OUT)|CUT TO|DISSOLVE TO|SMASH CUT|MATCH CUT|THE END|END|CONTINUED|TITLE|SUPER|MONTAGE|INTERCUT|BACK TO)\b")
+
+
+@dataclass
+class DialogueLine:
+    character: str
+    text: str
+    parenthetical: Optional[str] = None
+
+
+@dataclass
+class Scene:
+    index: int
+    heading: str
+    setting: str # INT. / EXT. / INT./EXT.
+    location: str
+    time_of_day: Optional[str]
+    text: str # Exact source text, heading line included
+    characters: List[str] = field(default_factory=list)
+    dialogue: List[DialogueLine] = field(default_factory=list)
+    action: List[str] = field(default_factory=list)
+
+    def summary(self, max_chars: int = 200) -> str:
+        # One-line digest used as context for neighbouring-scene edits.
+        parts = [self.heading]
+        if self.characters:
+            parts.append("Characters: " + ", ".join(self.characters))
+        if self.action:
+            first_action = " ".join(self.action[0].split())
+            parts.append(first_action if len(first_action) <= max_chars else first_action[:max_chars].rsplit(" ", 1)[0] + "...")
+        if self.dialogue:
+            last = self.dialogue[-1]
+            parts.append(f'Ends with {last.character}: "{_truncate(last.text, 80)}"')
+        return " | ".join(parts)
+
+
+@dataclass
+class ScriptDocument:
+    preamble: str # Anything before the first scene heading (title, logline, ...)
+    scenes: List[Scene]
+
+    @property
+    def characters(self) -> Dict[str, List[int]]:
+        # Character name -> indexes of the scenes they speak in, in order of first appearance.
+        index: Dict[str, List[int]] = {}
+        for scene in self.scenes:
+            for name in scene.characters:
+                index.setdefault(name, []).append(scene.index)
+        return index
+
+    def to_markdown(self) -> str:
+        return self.preamble + "".join(scene.text for scene in self.scenes)
+
+    def with_scene_text(self, scene_index: int, new_text: str) -> "ScriptDocument":
+        texts = [scene.text for scene in self.scenes]
+        texts[scene_index] = new_text
+        return parse_script(self.preamble + "".join(texts))
+
+    def to_dict(self, include_text: bool = False) -> dict:
+        scenes = []
+        for scene in self.scenes:
+            data = asdict(scene)
+            if not include_text:
+                del data["text"]
+            data["summary"] = scene.summary()
+            scenes.append(data)
+        return {"preamble": self.preamble, "scene_count": len(self.scenes), "scenes": scenes, "characters": self.characters}
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+def _strip_markdown(line: str) -> str:
+    return line.strip().strip("*_").strip()
+
+
+def parse_heading(line: str):
+    match = MARKDOWN_SCENE_HEADING_RE.match(line) or SCENE_HEADING_RE.match(line)
+    if not match:
+        return None
+    setting = match.group("setting").upper()
+    rest = _strip_markdown(match.group("rest"))
+    location, time_of_day = rest, None
+    for separator in (" - ", " – ", " — "):
+        if separator in rest:
+            location, time_of_day = rest.rsplit(separator, 1)
+            break
+    heading = f"{setting} {rest}".strip()
+    return heading, setting, location.strip(), (time_of_day.strip() if time_of_day else None)
+
+
+def character_cue(line: str) -> Optional[str]:
+    stripped = line.strip()
+    if not stripped or stripped.endswith(":") or stripped.startswith("#"):
+        return None
+    match = CHARACTER_CUE_RE.match(line)
+    if not match:
+        return None
+    name = " ".join(match.group("name").split())
+    if NON_CHARACTER_LINES.match(name) or not any(c.isalpha() for c in name):
+        return None
+    return name
+
+
+def _parse_scene_body(scene: Scene, body_lines: List[str]):
+    paragraphs: List[List[str]] = []
+    current: List[str] = []
+    for line in body_lines:
+        if line.strip():
+            current.append(line.rstrip("\n"))
+        elif current:
+            paragraphs.append(current)
+            current = []
+    if current:
+        paragraphs.append(current)
+
+    for paragraph in paragraphs:
+        name = character_cue(paragraph[0])
+        # A cue needs something under it; a lone ALL-CAPS line is action (e.g. a sound effect).
+        if name and len(paragraph) > 1:
+            parenthetical = None
+            spoken = []
+            for line in paragraph[1:]:
+                if PARENTHETICAL_RE.match(_strip_markdown(line)) and not spoken:
+                    parenthetical = _strip_markdown(line) # "*(muttering)*" -> "(muttering)"
+                else:
+                    spoken.append(line.strip())
+            scene.dialogue.append(DialogueLine(name, " ".join(spoken), parenthetical))
+            if name not in scene.characters:
+                scene.characters.append(name)
+        else:
+            scene.action.append(" ".join(_strip_markdown(line) for line in paragraph))
+
+
+def parse_script(markdown: str) -> ScriptDocument:
+    lines = markdown.splitlines(keepends=True)
+    preamble_lines: List[str] = []
+    scene_chunks = [] # (heading info, [lines])
+    for line in lines:
+        heading = parse_heading(line)
+        if heading is not None:
+            scene_chunks.append((heading, [line]))
+        elif scene_chunks:
+            scene_chunks[-1][1].append(line)
+        else:
+            preamble_lines.append(line)
+
+    scenes = []
+    for index, ((heading, setting, location, time_of_day), chunk) in enumerate(scene_chunks):
+        scene = Scene(index, heading, setting, location, time_of_day, "".join(chunk))
+        _parse_scene_body(scene, chunk[1:])
+        scenes.append(scene)
+    return ScriptDocument("".join(preamble_lines), scenes)
+
+
+def _tail(text: str, max_chars: int) -> str:
+    text = text.strip()
+    return text if len(text) <= max_chars else "..." + text[-max_chars:].split("\n", 1)[-1]
+
+
+def _head(text: str, max_chars: int) -> str:
+    text = text.strip()
+    return text if len(text) <= max_chars else text[:max_chars].rsplit("\n", 1)[0] + "\n..."
+
+
+def build_scene_prompt(document: ScriptDocument, scene_index: int, instruction: str, mode: str,
+                       context_scenes: int = 2, neighbour_excerpt_chars: int = 600) -> str:
+    """Compact prompt for editing one scene: one-line summaries of up to context_scenes scenes on
+    either side, short excerpts of the directly adjacent scenes, and the full text of the target only."""
+    scene = document.scenes[scene_index]
+    sections = []
+    title = _truncate(document.preamble, 300)
+    if title:
+        sections.append(f"SCRIPT TITLE / NOTES:\n{title}")
+
+    first = max(0, scene_index - context_scenes)
+    last = min(len(document.scenes), scene_index + context_scenes + 1)
+    neighbours = [f"Scene {s.index + 1}: {s.summary()}" for s in document.scenes[first:last] if s.index != scene_index]
+    if neighbours:
+        sections.append(f"NEIGHBOURING SCENES (summaries, for continuity only):\n" + "\n".join(neighbours))
+    recurring = [name for name, scene_indexes in document.characters.items() if len(scene_indexes) > 1 or scene_index in scene_indexes]
+    if recurring:
+        sections.append("KNOWN CHARACTERS: " + ", ".join(recurring))
+
+    if scene_index > 0:
+        sections.append(f"END OF PREVIOUS SCENE:\n{_tail(document.scenes[scene_index - 1].text, neighbour_excerpt_chars)}")
+    sections.append(f"SCENE {scene_index + 1} (the scene to {'rewrite' if mode == 'rewrite' else 'extend'}):\n{scene.text.strip()}")
+    if scene_index + 1 < len(document.scenes):
+        sections.append(f"START OF NEXT SCENE:\n{_head(document.scenes[scene_index + 1].text, neighbour_excerpt_chars)}")
+
+    if mode == "rewrite":
+        task = ("Rewrite SCENE {n} following the instruction below. Return ONLY the rewritten scene, starting with its "
+                "scene heading. Keep it consistent with the neighbouring scenes.")
+    else:
+        task = ("Continue SCENE {n} from where it ends, following the instruction below. Return ONLY the new material "
+                "that comes after the existing text - do not repeat the heading or any existing lines.")
+    sections.append(task.format(n=scene_index + 1) + f"\n\nINSTRUCTION: {instruction.strip() or 'Improve the scene.'}")
+    return "\n\n".join(sections)
+
+
+def clean_scene_output(output: str) -> str:
+    # Models sometimes wrap their answer in a ```markdown fence despite the instructions.
+    text = output.strip()
+    fence = re.match(r"^```[a-zA-Z]*\n(?P<body>.*?)\n?```$", text, re.DOTALL)
+    if fence:
+        text = fence.group("body").strip()
+    return text
+
+
+def _first_scene(text: str, skip_heading: bool) -> Tuple[str, int]:
+    # Cuts the text at the next scene heading (after its own first line when skip_heading), returning the kept
+    # text and how many further scenes were dropped.
+    lines = text.split("\n")
+    start = 1 if skip_heading else 0
+    cuts = [i for i in range(start, len(lines)) if parse_heading(lines[i]) is not None]
+    if not cuts:
+        return text, 0
+    return "\n".join(lines[:cuts[0]]).rstrip(), len(cuts)
+
+
+def splice_scene(document: ScriptDocument, scene_index: int, generated: str, mode: str) -> Tuple[str, int]:
+    """Returns the new source text for the scene, keeping the original's trailing blank lines so the
+    scenes around it stay separated exactly as before, and the number of extra scenes dropped from the output.
+
+    Only one scene is ever spliced in: further scene headings in the model's output would add scenes and shift
+    every later scene_index, so everything from the next heading on is discarded. In "extend" mode a repeated
+    heading at the start is dropped too."""
+    original = document.scenes[scene_index].text
+    trailing = original[len(original.rstrip()):] or "\n\n"
+    generated = clean_scene_output(generated)
+    starts_with_heading = parse_heading(generated.split("\n", 1)[0]) is not None
+    if mode == "rewrite":
+        generated, dropped = _first_scene(generated, skip_heading=starts_with_heading)
+        if not starts_with_heading:
+            # Keep the scene addressable even if the model dropped the heading.
+            generated = original.split("\n", 1)[0].rstrip() + "\n\n" + generated
+        return generated + trailing, dropped
+    if starts_with_heading:
+        generated = generated.split("\n", 1)[1].strip() if "\n" in generated else ""
+    generated, dropped = _first_scene(generated, skip_heading=False)
+    if not generated:
+        return original, dropped
+    return original.rstrip() + "\n\n" + generated + trailing, dropped
@@ -0,0 +1,12 @@
+import os
+import sys
+
+import pytest
+
+# The server uses flat imports (it runs as `cd python_server; uvicorn main:app`); make them resolve from any cwd.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio" # Everything here is asyncio-only (loop.call_later, asyncio.to_thread, ...)
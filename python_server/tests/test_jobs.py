@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+
+from jobs import JobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+async def wait_for_status(queue, job_id, statuses, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        assert time.monotonic() < deadline, f"job stayed {job['status']}"
+        await asyncio.sleep(0.01)
+
+
+async def _collect(events):
+    return [event async for event, _ in events]
+
+
+async def quick_runner(params, secret, on_delta):
+    on_delta("hello ")
+    on_delta(params["prompt"])
+    return 200, {"success": True, "data": {"script": "hello " + params["prompt"]}}
+
+
+async def test_job_runs_and_publishes_its_output(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), quick_runner, max_workers=1)
+    await queue.start()
+    try:
+        job = await queue.submit("script", {"prompt": "world"}, None, 1)
+        events = [event async for event in queue.subscribe(job["id"])]
+        assert events[-1][0] == "done"
+        assert events[-1][1]["status"] == "succeeded"
+        finished = await queue.get(job["id"])
+        assert finished["output"] == "hello world"
+        assert (await queue.get(job["id"], offset=6))["output"] == "world"
+    finally:
+        await queue.close()
+
+
+async def test_cancel_running_and_queued_jobs(tmp_path):
+    started = asyncio.Event()
+
+    async def blocking_runner(params, secret, on_delta):
+        on_delta("partial")
+        started.set()
+        await asyncio.Event().wait()
+
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), blocking_runner, max_workers=1)
+    await queue.start()
+    try:
+        running = await queue.submit("script", {}, None, 1)
+        queued = await queue.submit("script", {}, None, 1)
+        await asyncio.wait_for(started.wait(), 2)
+        subscriber = asyncio.create_task(asyncio.wait_for(_collect(queue.subscribe(running["id"])), 2))
+        await asyncio.sleep(0.01)
+
+        assert (await queue.cancel(queued["id"]))["status"] == "cancelled"
+        cancelled = await queue.cancel(running["id"])
+        assert cancelled["status"] == "cancelled"
+        assert cancelled["output"] == "partial" # Partial output is kept
+        events = await subscriber
+        assert events[-1] == "done"
+        assert queue.completed["cancelled"] == 2
+        assert queue.active_counts() == {"queued": 0, "running": 0}
+    finally:
+        await queue.close()
+
+
+async def test_cancel_while_the_result_is_being_stored_keeps_the_result(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), quick_runner, max_workers=1)
+    finish = queue._store.finish
+
+    def slow_finish(*args):
+        time.sleep(0.2)
+        return finish(*args)
+
+    queue._store.finish = slow_finish
+    await queue.start()
+    try:
+        job = await queue.submit("script", {"prompt": "x"}, None, 1)
+        subscriber = asyncio.create_task(asyncio.wait_for(_collect(queue.subscribe(job["id"])), 2))
+        while not (job["id"] in queue._live and queue._live[job["id"]].finishing):
+            await asyncio.sleep(0.005)
+        assert (await queue.cancel(job["id"]))["status"] == "succeeded"
+        assert (await subscriber)[-1] == "done"
+        assert queue.completed["succeeded"] == 1
+        assert job["id"] not in queue._live
+    finally:
+        await queue.close()
+
+
+async def test_restart_requeues_keyless_jobs_and_fails_keyed_ones(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    started = asyncio.Event()
+
+    async def stuck_runner(params, secret, on_delta):
+        started.set()
+        await asyncio.Event().wait()
+
+    queue = JobQueue(path, stuck_runner, max_workers=2)
+    await queue.start()
+    keyless = await queue.submit("script", {"prompt": "env key"}, None, 1)
+    keyed = await queue.submit("script", {"prompt": "own key"}, {"api_key": "secret"}, 1)
+    await asyncio.wait_for(started.wait(), 2)
+    await queue.close() # Like a server shutdown: both jobs are left "running" in the store
+
+    restarted = JobQueue(path, quick_runner, max_workers=1)
+    await restarted.start()
+    try:
+        recovered = await wait_for_status(restarted, keyless["id"], ("succeeded", "failed"))
+        assert recovered["status"] == "succeeded"
+        assert recovered["output"] == "hello env key"
+        interrupted = await restarted.get(keyed["id"])
+        assert interrupted["status"] == "failed"
+        assert interrupted["result"]["data"]["error_type"] == "JobInterrupted"
+        assert "secret" not in str(interrupted)
+    finally:
+        await restarted.close()
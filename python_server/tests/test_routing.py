@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from providers import ProviderAuthError, ProviderRateLimitError
+from routing import HealthTracker, RouteError, Router
+
+pytestmark = pytest.mark.anyio
+
+
+def make_attempt(behaviours, cancelled=None):
+    # behaviours[i] is (delay seconds, result or exception) for candidate i.
+    async def attempt(index):
+        delay, outcome = behaviours[index]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(index)
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return attempt
+
+
+async def test_retryable_failure_fails_over_to_the_next_candidate():
+    route = await Router().run(3, make_attempt([(0, ProviderRateLimitError("slow down")), (0, "b"), (0, "c")]))
+    assert (route.value, route.index) == ("b", 1)
+    assert [(a.index, a.outcome, a.hedge) for a in route.attempts] == [(0, "error", False), (1, "success", False)]
+
+
+async def test_non_retryable_failure_stops_failover():
+    with pytest.raises(RouteError) as raised:
+        await Router().run(2, make_attempt([(0, ProviderAuthError("bad key")), (0, "b")]))
+    assert isinstance(raised.value.error, ProviderAuthError)
+    assert [a.index for a in raised.value.attempts] == [0]
+
+
+async def test_all_candidates_failing_reports_the_last_retryable_error():
+    errors = [ProviderRateLimitError("first"), ProviderRateLimitError("second")]
+    with pytest.raises(RouteError) as raised:
+        await Router().run(2, make_attempt([(0, errors[0]), (0, errors[1])]))
+    assert raised.value.error is errors[1]
+    assert [a.outcome for a in raised.value.attempts] == ["error", "error"]
+
+
+async def test_slow_candidate_is_hedged_and_the_loser_cancelled():
+    cancelled = []
+    route = await Router(max_hedges=1).run(2, make_attempt([(5, "slow"), (0.01, "fast")], cancelled), hedge_after=0.05)
+    assert (route.value, route.index) == ("fast", 1)
+    assert [(a.index, a.outcome, a.hedge) for a in route.attempts] == [(0, "cancelled", False), (1, "success", True)]
+    assert cancelled == [0]
+
+
+async def test_no_hedge_when_the_first_candidate_is_fast_enough():
+    route = await Router().run(2, make_attempt([(0.01, "a"), (0, "b")]), hedge_after=1.0)
+    assert route.index == 0
+    assert len(route.attempts) == 1
+
+
+def test_health_order_puts_unhealthy_candidates_last():
+    health = HealthTracker(failure_threshold=2, cooldown_seconds=60)
+    candidates = [("anthropic", "claude"), ("gemini", "gemini")]
+    assert health.order(candidates) == [0, 1]
+    for _ in range(2):
+        health.observe("anthropic", "claude", 0.1, ok=False)
+    assert not health.healthy("anthropic", "claude")
+    assert health.order(candidates) == [1, 0]
+
+
+def test_fastest_strategy_prefers_measured_low_latency():
+    health = HealthTracker()
+    health.observe("anthropic", "claude", 2.0, ok=True)
+    health.observe("gemini", "gemini", 0.5, ok=True)
+    candidates = [("anthropic", "claude"), ("gemini", "gemini"), ("other", "new")]
+    assert health.order(candidates, "fastest") == [1, 0, 2] # Unmeasured candidates go after measured ones
+    assert health.order(candidates, "ordered") == [0, 1, 2]
@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+import pytest
+
+from providers import ProviderAuthError, ProviderRateLimitError
+from scheduler import ProviderScheduler
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_queued_requests_are_admitted_by_priority():
+    scheduler = ProviderScheduler({"p": {"max_concurrency": 1}})
+    first = await scheduler.acquire("p", "m")
+    admitted = []
+
+    async def wait_for_slot(priority):
+        ticket = await scheduler.acquire("p", "m", priority)
+        admitted.append(priority)
+        scheduler.release(ticket)
+
+    tasks = []
+    for priority in ("batch", "background", "interactive"):
+        tasks.append(asyncio.create_task(wait_for_slot(priority)))
+        await asyncio.sleep(0) # Queue them in this order
+    assert scheduler.stats()["p"]["queued"] == 3
+    scheduler.release(first)
+    await asyncio.gather(*tasks)
+    assert admitted == ["interactive", "background", "batch"]
+
+
+async def test_concurrency_cap_is_respected():
+    scheduler = ProviderScheduler({"p": {"max_concurrency": 2, "models": {"slow": {"max_concurrency": 1}}}})
+    active = {"p": 0, "slow": 0}
+    peak = {"p": 0, "slow": 0}
+
+    async def call(model):
+        active["p"] += 1
+        active[model] = active.get(model, 0) + 1
+        peak["p"] = max(peak["p"], active["p"])
+        peak[model] = max(peak.get(model, 0), active[model])
+        await asyncio.sleep(0.01)
+        active["p"] -= 1
+        active[model] -= 1
+        return model
+
+    results = await asyncio.gather(*(scheduler.run("p", model, lambda model=model: call(model)) for model in ["fast", "slow"] * 4))
+    assert results == ["fast", "slow"] * 4
+    assert peak["p"] == 2
+    assert peak["slow"] == 1
+
+
+async def test_rate_limit_pauses_the_provider_for_retry_after():
+    scheduler = ProviderScheduler({"p": {"max_concurrency": 1}}, base_backoff_seconds=0.01)
+    started = {}
+
+    async def limited():
+        started["limited"] = time.monotonic()
+        await asyncio.sleep(0.01)
+        raise ProviderRateLimitError("slow down", retry_after=0.3)
+
+    async def next_call():
+        started["next"] = time.monotonic()
+        return "ok"
+
+    first = asyncio.create_task(scheduler.run("p", "m", limited, max_retries=0))
+    await asyncio.sleep(0) # Let the 429 call take the only slot first
+    second = asyncio.create_task(scheduler.run("p", "m", next_call, max_retries=0))
+    with pytest.raises(ProviderRateLimitError):
+        await first
+    assert await second == "ok"
+    assert started["next"] - started["limited"] >= 0.3
+    assert scheduler.stats()["p"]["rate_limited"] == 1
+
+
+async def test_retryable_errors_are_retried_and_others_are_not():
+    scheduler = ProviderScheduler({}, max_retries=2, base_backoff_seconds=0.001, max_backoff_seconds=0.01)
+    calls = {"flaky": 0, "auth": 0}
+
+    async def flaky():
+        calls["flaky"] += 1
+        if calls["flaky"] < 3:
+            raise ProviderRateLimitError("slow down")
+        return "ok"
+
+    async def bad_key():
+        calls["auth"] += 1
+        raise ProviderAuthError("bad key")
+
+    assert await scheduler.run("p", "m", flaky) == "ok"
+    assert calls["flaky"] == 3
+    with pytest.raises(ProviderAuthError):
+        await scheduler.run("p", "m", bad_key)
+    assert calls["auth"] == 1
+
+
+async def test_cancelled_waiter_gives_its_place_up():
+    scheduler = ProviderScheduler({"p": {"max_concurrency": 1}})
+    held = await scheduler.acquire("p", "m")
+    waiter = asyncio.create_task(scheduler.acquire("p", "m"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    scheduler.release(held)
+    ticket = await asyncio.wait_for(scheduler.acquire("p", "m"), 1)
+    assert scheduler.stats()["p"]["active"] == 1
+    scheduler.release(ticket)
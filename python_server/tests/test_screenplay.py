@@ -0,0 +1,99 @@
+from screenplay import parse_heading, parse_script, splice_scene
+
+SCRIPT = """# The Heist
+
+A short film.
+
+## INT. COFFEE SHOP - DAY
+
+Rain streaks the window. MAYA (30s) waits.
+
+MAYA
+(muttering)
+He's late.
+
+**TOM (V.O.)**
+*(whispering)*
+I'm right here.
+
+## EXT. PARKING LOT - NIGHT
+
+Ext. notes like this one are action, not a heading.
+
+TOM
+We go now.
+
+CUT TO:
+
+## Int. Van - Continuous
+
+MAYA
+Drive.
+"""
+
+
+def test_parse_script_splits_scenes_and_keeps_the_preamble():
+    document = parse_script(SCRIPT)
+    assert document.preamble == "# The Heist\n\nA short film.\n\n"
+    assert [scene.heading for scene in document.scenes] == [
+        "INT. COFFEE SHOP - DAY", "EXT. PARKING LOT - NIGHT", "INT. Van - Continuous",
+    ]
+    first = document.scenes[0]
+    assert (first.setting, first.location, first.time_of_day) == ("INT.", "COFFEE SHOP", "DAY")
+    assert document.to_markdown() == SCRIPT
+
+
+def test_dialogue_cues_and_parentheticals():
+    document = parse_script(SCRIPT)
+    first = document.scenes[0]
+    assert first.characters == ["MAYA", "TOM"]
+    assert [(line.character, line.parenthetical, line.text) for line in first.dialogue] == [
+        ("MAYA", "(muttering)", "He's late."),
+        ("TOM", "(whispering)", "I'm right here."),
+    ]
+    assert document.scenes[1].characters == ["TOM"] # "CUT TO:" is not a character
+    assert document.characters == {"MAYA": [0, 2], "TOM": [0, 1]}
+
+
+def test_mixed_case_headings_need_a_markdown_marker():
+    assert parse_heading("Ext. notes should not be a heading") is None
+    assert parse_heading("EXT. ROOFTOP - DAY")[0] == "EXT. ROOFTOP - DAY"
+    assert parse_heading("### int./ext. car - night")[1] == "INT./EXT."
+    assert parse_heading("**INT. HALLWAY**")[2] == "HALLWAY"
+
+
+def test_rewrite_replaces_only_its_scene():
+    document = parse_script(SCRIPT)
+    generated = "## INT. COFFEE SHOP - DAY\n\nThe rain has stopped.\n"
+    scene_text, dropped = splice_scene(document, 0, generated, "rewrite")
+    updated = document.with_scene_text(0, scene_text).to_markdown()
+    assert dropped == 0
+    assert "The rain has stopped." in updated
+    assert updated.startswith(document.preamble)
+    assert updated.endswith("".join(scene.text for scene in document.scenes[1:])) # Later scenes byte-for-byte
+
+
+def test_rewrite_drops_extra_scenes_and_restores_a_missing_heading():
+    document = parse_script(SCRIPT)
+    generated = "```markdown\nNew action.\n\n## INT. SOMEWHERE ELSE - DAY\n\nMore.\n\n## EXT. AND ANOTHER - DAY\n```"
+    scene_text, dropped = splice_scene(document, 0, generated, "rewrite")
+    assert dropped == 2
+    assert scene_text.startswith("## INT. COFFEE SHOP - DAY\n\nNew action.")
+    updated = parse_script(document.with_scene_text(0, scene_text).to_markdown())
+    assert len(updated.scenes) == len(document.scenes)
+
+
+def test_extend_appends_after_the_scene_without_a_repeated_heading():
+    document = parse_script(SCRIPT)
+    generated = "## EXT. PARKING LOT - NIGHT\n\nSirens in the distance.\n\n## INT. POLICE STATION - NIGHT\n\nPhones ring."
+    scene_text, dropped = splice_scene(document, 1, generated, "extend")
+    assert dropped == 1
+    assert scene_text.startswith(document.scenes[1].text.rstrip() + "\n\nSirens in the distance.")
+    assert scene_text.count("## EXT. PARKING LOT") == 1
+    assert "POLICE STATION" not in scene_text
+
+
+def test_extend_with_nothing_new_leaves_the_scene_unchanged():
+    document = parse_script(SCRIPT)
+    scene_text, _ = splice_scene(document, 1, "## EXT. PARKING LOT - NIGHT\n", "extend")
+    assert scene_text == document.scenes[1].text
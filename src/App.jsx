@@ -228,7 +228,9 @@ function App() {
           setGeneratedScript(result.data.script);
         } else {
           let errorMessage = `Error generating script: ${result.error || 'Unknown error'}`;
-          if (result.data && result.data.error_type === 'ResourceExhausted' && selectedScriptModel.startsWith('gemini-')) {
+          // On an HTTP error the main process passes the server's whole payload as result.data, so the error details are one level down.
+          const errorDetails = (result.data && result.data.data) || result.data || {};
+          if (['RESOURCE_EXHAUSTED', 'ResourceExhausted'].includes(errorDetails.error_type) && selectedScriptModel.startsWith('gemini-')) {
             errorMessage += `\n\nThis often means you\'ve exceeded the free tier quota for the selected Gemini model, or the model requires a billing-enabled account. Please check your Google Cloud project quotas and billing status. More info: https://ai.google.dev/gemini-api/docs/rate-limits`;
           }
           if (result.data && result.data.raw_error) {